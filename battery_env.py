@@ -7,7 +7,11 @@ Altering this file can disrupt the proper functioning of the simulation and eval
 Please adhere to the provided structure and use the defined classes as they are.
 """
 
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
+from battery_kernel import simulate_episodes
+from market_data import ColumnarMarketData, open_market_data
 from plotting import plot_results
 
 class Battery:
@@ -70,8 +74,53 @@ class Battery:
         """
         return self.state_of_charge
 
+class StepInfo(Mapping):
+    __slots__ = ('total_profit', 'profit_delta', 'battery_soc', 'max_charge_rate', 'max_discharge_rate',
+                 'remaining_steps', 'features')
+    _KEYS = __slots__[:-1]
+
+    def __init__(self, total_profit, profit_delta, battery_soc, max_charge_rate, max_discharge_rate,
+                 remaining_steps, features=None):
+        """
+        Compact per-step info passed to policies. It behaves like the read-only dictionary
+        described in Policy.act, supporting info['key'], info.get('key') and iteration, without
+        allocating a dictionary on every step. 'features' is only present when attached.
+        """
+        self.total_profit = total_profit
+        self.profit_delta = profit_delta
+        self.battery_soc = battery_soc
+        self.max_charge_rate = max_charge_rate
+        self.max_discharge_rate = max_discharge_rate
+        self.remaining_steps = remaining_steps
+        self.features = features
+
+    def __getitem__(self, key):
+        if key in self._KEYS or (key == 'features' and self.features is not None):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._KEYS or (key == 'features' and self.features is not None):
+            return getattr(self, key)
+        return default
+
+    def __contains__(self, key):
+        return key in self._KEYS or (key == 'features' and self.features is not None)
+
+    def __iter__(self):
+        yield from self._KEYS
+        if self.features is not None:
+            yield 'features'
+
+    def __len__(self):
+        return len(self._KEYS) + (self.features is not None)
+
+    def __repr__(self):
+        return f'StepInfo({dict(self)!r})'
+
 class BatteryEnv:
-    def __init__(self, capacity=100, charge_rate=50, discharge_rate=50, initial_charge=50, data='train.csv'):
+    def __init__(self, capacity=100, charge_rate=50, discharge_rate=50, initial_charge=50, data='train.csv', backend='pandas',
+                 reuse_views=False):
         """
         Environment for simulating battery operation in a market context.
 
@@ -79,13 +128,43 @@ class BatteryEnv:
         :param charge_rate: Maximum charging rate of the battery in kW.
         :param discharge_rate: Maximum discharging rate of the battery in kW.
         :param initial_charge: Initial state of charge of the battery in kWh.
-        :param data: Path to the CSV file containing market data.
+        :param data: Path to the CSV file containing market data, or already loaded market data.
+        :param backend: Market data backend, 'pandas' (default) or 'columnar' for NumPy arrays.
+        :param reuse_views: Return the same info object, and with the columnar or cached backend the
+                            same observation object, on every step, updated in place. This avoids all
+                            per-step allocations, but policies must not keep references to them.
         """
         self.battery = Battery(capacity, charge_rate, discharge_rate, initial_charge)
-        self.market_data = pd.read_csv(data)
+        self.market_data = open_market_data(data, backend)
+        if isinstance(self.market_data, pd.DataFrame):
+            self._observation = self._dataframe_observation
+            self._market_price = self._dataframe_market_price
+        else:
+            self._observation = self.market_data.row
+            self._market_price = self.market_data.price
         self.total_profit = 0
         self.current_step = 0
         self.episode_length = len(self.market_data)  # Default to full length
+        self.features = None
+
+        self.reuse_views = reuse_views
+        self._info = StepInfo(0, 0, 0, 0, 0, 0) if reuse_views else None
+        self._features_view = None
+        if reuse_views and isinstance(self.market_data, ColumnarMarketData):
+            self._observation_view = self.market_data.row(0)
+            self._observation = self._observation_view.seek
+
+    def attach_features(self, features):
+        """
+        Attach precomputed features; the current row is then passed to policies as info['features'].
+
+        :param features: FeatureStore computed from this environment's market data.
+        """
+        if len(features) != len(self.market_data):
+            raise ValueError(f'Features have {len(features)} rows but the market data has {len(self.market_data)}')
+        self.features = features
+        if self.reuse_views:
+            self._features_view = features.row(0)
 
     def reset(self, start_step=0, episode_length=None, initial_soc=None):
         """
@@ -100,17 +179,23 @@ class BatteryEnv:
         self.episode_length = episode_length if episode_length else len(self.market_data) - start_step
         initial_soc = initial_soc if initial_soc is not None else self.battery.initial_charge
         self.battery.state_of_charge = min(initial_soc, self.battery.capacity)
-        return self.market_data.iloc[self.current_step], self.get_info()
+        return self._observation(self.current_step), self.get_info()
 
     def step(self, action):
         if self.current_step >= len(self.market_data) - 1:
             return None, None
-        market_price = self.market_data.iloc[self.current_step]['Market_Price']
+        market_price = self._market_price(self.current_step)
         profit_delta = self.process_action(action, market_price)
         self.current_step += 1
-        market_data = self.market_data.iloc[self.current_step]
+        market_data = self._observation(self.current_step)
         return market_data, self.get_info(profit_delta)
 
+    def _dataframe_observation(self, step):
+        return self.market_data.iloc[step]
+
+    def _dataframe_market_price(self, step):
+        return self.market_data.iloc[step]['Market_Price']
+
     def process_action(self, action, market_price):
         duration = 5
         if action > 0:
@@ -121,17 +206,78 @@ class BatteryEnv:
             return energy_removed * (duration / 60) * market_price
         return 0
 
+    def market_prices(self, start=0, stop=None):
+        """
+        Return the market prices of a range of steps as an array.
+
+        :param start: First step of the range.
+        :param stop: Step after the last one of the range; defaults to the end of the data.
+        """
+        if isinstance(self.market_data, pd.DataFrame):
+            return self.market_data['Market_Price'].to_numpy()[start:stop]
+        return self.market_data.prices(start, stop)
+
+    def battery_params(self):
+        """
+        Return the battery parameters and episode settings passed to Policy.act_vectorized.
+        """
+        return {
+            'capacity': self.battery.capacity,
+            'charge_rate': self.battery.charge_rate,
+            'discharge_rate': self.battery.discharge_rate,
+            'efficiency': self.battery.efficiency,
+            'initial_soc': self.battery.state_of_charge,
+            'duration': 5,
+        }
+
+    def simulate(self, actions):
+        """
+        Apply a whole array of actions from the current step to the end of the market data,
+        equivalent to calling step once per action but without building observations and infos.
+
+        :param actions: One action per remaining step; the first applies to the current step.
+                        Actions beyond the last step that can be taken are ignored.
+        :return: Lists of the actions taken, total profit, battery state of charge and the market
+                 price of the following step, as recorded by evaluate.run_trial.
+        """
+        num_steps = max(len(self.market_data) - 1 - self.current_step, 0)
+        if len(actions) < num_steps:
+            raise ValueError(f'Expected at least {num_steps} actions, got {len(actions)}')
+        actions = np.asarray(actions[:num_steps], dtype=float)
+        prices = np.asarray(self.market_prices(self.current_step), dtype=float)
+
+        battery = self.battery
+        profits, socs = simulate_episodes(actions, prices[:num_steps], battery.state_of_charge, battery.capacity,
+                                          battery.charge_rate, battery.discharge_rate, battery.efficiency,
+                                          initial_profits=self.total_profit)
+        if num_steps:
+            self.total_profit = float(profits[-1])
+            battery.state_of_charge = float(socs[-1])
+        self.current_step += num_steps
+        return actions.tolist(), profits.tolist(), socs.tolist(), prices[1:num_steps + 1].tolist()
+
     def get_info(self, profit_delta=0):
         self.total_profit += profit_delta
         remaining_steps = len(self.market_data) - self.current_step - 1
-        return {
-            'total_profit': self.total_profit,
-            'profit_delta': profit_delta,
-            'battery_soc': self.battery.get_state_of_charge(),
-            'max_charge_rate': self.battery.charge_rate,
-            'max_discharge_rate': self.battery.discharge_rate,
-            'remaining_steps': remaining_steps
-        }
+        if self.features is None:
+            features = None
+        elif self._features_view is not None:
+            features = self._features_view.seek(self.current_step)
+        else:
+            features = self.features.row(self.current_step)
+
+        info = self._info
+        if info is None:
+            return StepInfo(self.total_profit, profit_delta, self.battery.get_state_of_charge(), self.battery.charge_rate,
+                            self.battery.discharge_rate, remaining_steps, features)
+        info.total_profit = self.total_profit
+        info.profit_delta = profit_delta
+        info.battery_soc = self.battery.get_state_of_charge()
+        info.max_charge_rate = self.battery.charge_rate
+        info.max_discharge_rate = self.battery.discharge_rate
+        info.remaining_steps = remaining_steps
+        info.features = features
+        return info
 
 
 def main():
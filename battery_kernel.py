@@ -0,0 +1,184 @@
+"""
+Batch kernel for the battery charge/discharge recurrence.
+
+simulate_episodes applies whole arrays of actions to many batteries at once, with the exact
+arithmetic of Battery.charge, Battery.discharge and BatteryEnv.process_action: the same
+floating-point operations in the same order, so states of charge and profits match the
+reference classes to the last bit. If numba is installed the recurrence is JIT compiled;
+otherwise a pure-Python loop over plain floats is used for a few episodes and a NumPy loop
+stepping all episodes in lockstep for many.
+
+Example:
+    profits, socs = simulate_episodes(actions, prices, initial_socs=50.0, capacity=100,
+                                      charge_rate=50, discharge_rate=50, efficiency=0.9)
+"""
+
+import numpy as np
+
+KERNELS = ('numba', 'python', 'numpy')
+# Below this many episodes the scalar Python loop beats stepping NumPy arrays in lockstep
+LOCKSTEP_MIN_EPISODES = 64
+
+
+def step_batteries(state_of_charge, actions, market_prices, capacity, charge_rate, discharge_rate, efficiency, duration=5):
+    """
+    Apply one action to each of many batteries, as BatteryEnv.process_action does for one.
+
+    :param state_of_charge: Array of states of charge in kWh.
+    :param actions: Array of actions in kW; positive charges, negative discharges.
+    :param market_prices: Market price at the current step of each battery's episode.
+    :param capacity: Capacity in kWh, a scalar or one per battery; likewise the rates and efficiency.
+    :return: New states of charge and the profit delta of each battery.
+    """
+    charging = actions > 0
+    discharging = actions < 0
+    assert np.all(~charging | (actions <= charge_rate)), "Charging power cannot exceed the maximum charging rate."
+    assert np.all(~discharging | (-actions <= discharge_rate)), "Discharging power cannot exceed the maximum discharging rate."
+
+    soc = state_of_charge
+    charge_power = np.minimum(np.where(charging, actions, 0.0), charge_rate)
+    energy_add_order = charge_power * (duration / 60) * efficiency
+    energy_added = np.minimum(energy_add_order, capacity - soc)
+
+    discharge_power = np.minimum(np.where(discharging, -actions, 0.0), discharge_rate)
+    energy_remove_order = discharge_power * (duration / 60) / efficiency
+    energy_removed = np.minimum(energy_remove_order, soc)
+
+    new_soc = np.where(
+        charging, np.minimum(soc + energy_add_order, capacity),
+        np.where(discharging, np.maximum(soc - energy_remove_order, 0), soc))
+    profit_delta = np.where(
+        charging, -energy_added * (duration / 60) * market_prices,
+        np.where(discharging, energy_removed * (duration / 60) * market_prices, 0.0))
+    return new_soc, profit_delta
+
+
+def _run_episodes(actions, prices, initial_socs, initial_profits, capacity, charge_rate, discharge_rate, efficiency,
+                  duration, profits, socs):
+    # Runs on nested lists of plain floats, or compiled by numba on arrays; keep the operation order of Battery
+    hours = duration / 60
+    for episode in range(len(actions)):
+        episode_actions = actions[episode]
+        episode_prices = prices[episode]
+        episode_profits = profits[episode]
+        episode_socs = socs[episode]
+        soc = initial_socs[episode]
+        total_profit = initial_profits[episode]
+        for step in range(len(episode_actions)):
+            action = episode_actions[step]
+            if action > 0:
+                power = min(action, charge_rate)
+                energy_add_order = power * hours * efficiency
+                energy_added = min(energy_add_order, capacity - soc)
+                soc = min(soc + energy_add_order, capacity)
+                total_profit += -energy_added * hours * episode_prices[step]
+            elif action < 0:
+                power = min(-action, discharge_rate)
+                energy_remove_order = power * hours / efficiency
+                energy_removed = min(energy_remove_order, soc)
+                soc = max(soc - energy_remove_order, 0.0)
+                total_profit += energy_removed * hours * episode_prices[step]
+            episode_profits[step] = total_profit
+            episode_socs[step] = soc
+
+
+_run_episodes_numba = None
+_numba_error = None
+
+
+def _numba_kernel():
+    # numba is imported and the kernel compiled on first use, so importing this module (and
+    # BatteryEnv with it) never pays for importing numba
+    global _run_episodes_numba, _numba_error
+    if _run_episodes_numba is None and _numba_error is None:
+        try:
+            import numba
+        except ImportError as error:
+            _numba_error = error
+        else:
+            _run_episodes_numba = numba.njit(cache=True)(_run_episodes)
+    return _run_episodes_numba
+
+
+def numba_available():
+    """
+    Return whether the numba kernel can be used, importing numba on the first call.
+    """
+    return _numba_kernel() is not None
+
+
+def _simulate_python(actions, prices, initial_socs, initial_profits, capacity, charge_rate, discharge_rate, efficiency,
+                     duration, profits, socs):
+    profit_lists = profits.tolist()
+    soc_lists = socs.tolist()
+    _run_episodes(actions.tolist(), prices.tolist(), initial_socs.tolist(), initial_profits.tolist(), capacity,
+                  charge_rate, discharge_rate, efficiency, duration, profit_lists, soc_lists)
+    profits[...] = profit_lists
+    socs[...] = soc_lists
+
+
+def _simulate_numpy(actions, prices, initial_socs, initial_profits, capacity, charge_rate, discharge_rate, efficiency,
+                    duration, profits, socs):
+    soc = initial_socs.copy()
+    total_profit = initial_profits.copy()
+    for step in range(actions.shape[1]):
+        soc, profit_delta = step_batteries(soc, actions[:, step], prices[:, step], capacity, charge_rate, discharge_rate,
+                                           efficiency, duration)
+        total_profit = total_profit + profit_delta
+        profits[:, step] = total_profit
+        socs[:, step] = soc
+
+
+def simulate_episodes(actions, prices, initial_socs, capacity, charge_rate, discharge_rate, efficiency=0.9, duration=5,
+                      initial_profits=0.0, kernel=None):
+    """
+    Run the battery recurrence over whole episodes of actions for many batteries.
+
+    :param actions: Array of shape (episodes, steps), or (steps,) for one episode, of actions in kW.
+                    Pad shorter episodes with zero actions, which leave a battery unchanged.
+    :param prices: Market prices of the same shape as actions, or of shape (steps,) shared by every episode.
+    :param initial_socs: Initial state of charge of each battery in kWh.
+    :param capacity: Maximum capacity of the batteries in kWh.
+    :param charge_rate: Maximum charging rate in kW.
+    :param discharge_rate: Maximum discharging rate in kW.
+    :param efficiency: Charging and discharging efficiency.
+    :param duration: Duration of a step in minutes.
+    :param initial_profits: Profit of each episode before the first action, added to step by step.
+    :param kernel: 'numba', 'python' or 'numpy'; by default numba if installed, otherwise
+                   'python' for fewer than LOCKSTEP_MIN_EPISODES episodes and 'numpy' for more.
+    :return: Arrays of the shape of actions holding the total profit and the state of charge after each step.
+    """
+    actions = np.asarray(actions, dtype=float)
+    single = actions.ndim == 1
+    actions = np.atleast_2d(actions)
+    n_episodes, n_steps = actions.shape
+    prices = np.broadcast_to(np.asarray(prices, dtype=float), (n_episodes, n_steps))
+    initial_socs = np.broadcast_to(np.asarray(initial_socs, dtype=float), (n_episodes,))
+    initial_profits = np.broadcast_to(np.asarray(initial_profits, dtype=float), (n_episodes,))
+    assert np.all(actions[actions > 0] <= charge_rate), "Charging power cannot exceed the maximum charging rate."
+    assert np.all(-actions[actions < 0] <= discharge_rate), "Discharging power cannot exceed the maximum discharging rate."
+
+    if kernel is None:
+        if numba_available():
+            kernel = 'numba'
+        else:
+            kernel = 'python' if n_episodes < LOCKSTEP_MIN_EPISODES else 'numpy'
+    if kernel == 'numba':
+        if not numba_available():
+            raise ImportError("The 'numba' kernel requires numba; install it or use the 'python' or 'numpy' kernel")
+        run = _run_episodes_numba
+    elif kernel == 'python':
+        run = _simulate_python
+    elif kernel == 'numpy':
+        run = _simulate_numpy
+    else:
+        raise ValueError(f'Unknown kernel {kernel!r}, expected one of {KERNELS}')
+
+    profits = np.empty((n_episodes, n_steps))
+    socs = np.empty((n_episodes, n_steps))
+    run(np.ascontiguousarray(actions), np.ascontiguousarray(prices), np.ascontiguousarray(initial_socs),
+        np.ascontiguousarray(initial_profits), float(capacity), float(charge_rate), float(discharge_rate),
+        float(efficiency), float(duration), profits, socs)
+    if single:
+        return profits[0], socs[0]
+    return profits, socs
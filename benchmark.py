@@ -0,0 +1,461 @@
+"""
+Benchmarks for the hot paths of the battery simulation.
+
+Each benchmark is a subcommand, e.g. ``python benchmark.py env --days 365``. Datasets are
+generated by synthetic_data.py and written to a temporary directory so the benchmarks never
+touch train.csv; ``--preset small|medium|large`` selects one of the standard dataset sizes.
+"""
+
+import argparse
+from collections import deque
+import gc
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from battery_env import Battery, BatteryEnv
+from battery_kernel import KERNELS, numba_available, simulate_episodes
+from market_data import load_cached
+from evaluate import run_trial
+from policies.rolling_average import RollingAveragePolicy
+from plotting import plot_results, plot_runs
+from portfolio_env import PortfolioEnv, run_portfolio
+from runner import Runner
+from stats import DEFAULT_QUANTILES, ProfitStats
+from synthetic_data import PRESETS, REGIONS, RegionGenerator, write_csv
+from trial_plan import sample_episode
+from vector_env import VectorBatteryEnv, run_trials
+
+
+def make_dataset(path, days=365, seed=0, region='NSW1'):
+    """
+    Write a synthetic market data CSV with 5-minute intervals in the train.csv format.
+
+    :param path: Path of the CSV file to write.
+    :param days: Number of days of data to generate.
+    :param seed: Seed of the synthetic data.
+    :param region: Region whose price and demand structure is generated, see synthetic_data.REGIONS.
+    :return: Number of rows written.
+    """
+    return write_csv(path, RegionGenerator(region, seed=seed), days)
+
+
+def run_steps(env, steps):
+    """
+    Step an environment with a constant action and return the achieved steps per second.
+    """
+    state, info = env.reset()
+    start = time.perf_counter()
+    for _ in range(steps):
+        state, info = env.step(0)
+        if state is None:
+            break
+    return steps / (time.perf_counter() - start)
+
+
+def bench_env(args, data):
+    """
+    Compare BatteryEnv.step throughput of the pandas iloc backend with the columnar and chunked backends.
+    """
+    for backend in ('pandas', 'columnar', 'chunked'):
+        start = time.perf_counter()
+        env = BatteryEnv(data=data, backend=backend)
+        load_time = time.perf_counter() - start
+        steps = min(args.steps, len(env.market_data) - 1)
+        rate = run_steps(env, steps)
+        print(f'{backend:>10}: load {load_time:6.2f}s, {rate:12,.0f} steps/s')
+
+
+def bench_vector(args, data):
+    """
+    Compare running trials one after another against stepping them in lockstep with VectorBatteryEnv.
+    """
+    env = BatteryEnv(data=data, backend='columnar')
+    episodes = [sample_episode(args.seed + trial, len(env.market_data)) for trial in range(args.trials)]
+    start_steps, episode_lengths = zip(*episodes)
+    total_steps = sum(len(env.market_data) - 1 - start for start in start_steps)
+
+    start = time.perf_counter()
+    for start_step, episode_length in episodes:
+        run_trial(env, RollingAveragePolicy(), start_step, episode_length)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_env = VectorBatteryEnv(args.trials, data=env.market_data)
+    run_trials(vector_env, RollingAveragePolicy(), start_steps, episode_lengths)
+    vector_time = time.perf_counter() - start
+
+    print(f'{args.trials} trials, {total_steps} episode steps')
+    print(f'    serial: {serial_time:8.2f}s, {total_steps / serial_time:12,.0f} steps/s')
+    print(f'vectorized: {vector_time:8.2f}s, {total_steps / vector_time:12,.0f} steps/s')
+
+
+def bench_cache(args, data):
+    """
+    Compare parsing the CSV with a cold (converting) and a warm (memory-mapped) binary cache load.
+    """
+    cache_dir = os.path.join(os.path.dirname(data), 'cache')
+    timings = {}
+    for name, load in (('read_csv', lambda: pd.read_csv(data)),
+                       ('cache cold', lambda: load_cached(data, cache_dir)),
+                       ('cache warm', lambda: load_cached(data, cache_dir))):
+        start = time.perf_counter()
+        load()
+        timings[name] = time.perf_counter() - start
+        print(f'{name:>10}: {timings[name]:8.3f}s')
+    print(f'Warm cache loads {timings["read_csv"] / timings["cache warm"]:.1f}x faster than read_csv')
+
+
+def bench_rolling(args, data):
+    """
+    Compare the rolling average of a deque recomputed with np.mean on every step, as
+    RollingAveragePolicy originally did, against the incremental policy, and count steps where the
+    two disagree on the decision. Besides the synthetic prices, flat and rounded prices check the
+    ties where a rounded mean equals the price.
+    """
+    prices = pd.read_csv(data)['Market_Price'].to_numpy()[:args.steps]
+    rng = np.random.default_rng(args.seed)
+    series = {
+        'synthetic': prices,
+        'flat': np.full(len(prices), 0.3),
+        'rounded': np.round(rng.uniform(0.2, 0.5, len(prices)), 1),
+    }
+    info = {'max_charge_rate': 1.0, 'max_discharge_rate': 1.0}
+    mismatched = False
+    for name, values in series.items():
+        for window_size in (3, 10, 100, 1000, 10000):
+            past_prices = deque(maxlen=window_size)
+            start = time.perf_counter()
+            old_decisions = []
+            for price in values:
+                past_prices.append(price)
+                old_decisions.append(price > np.mean(past_prices))
+            deque_time = time.perf_counter() - start
+
+            policy = RollingAveragePolicy(window_size)
+            start = time.perf_counter()
+            new_decisions = [policy.act({'Market_Price': price}, info) < 0 for price in values]
+            incremental_time = time.perf_counter() - start
+
+            mismatches = sum(old != new for old, new in zip(old_decisions, new_decisions))
+            mismatched = mismatched or mismatches > 0
+            print(f'{name:>9} window {window_size:>6}: np.mean {len(values) / deque_time:10,.0f} steps/s, '
+                  f'RollingAveragePolicy {len(values) / incremental_time:10,.0f} steps/s, {mismatches} differing decisions')
+    if mismatched:
+        sys.exit('MISMATCH: RollingAveragePolicy changed decisions')
+
+
+def bench_portfolio(args, data):
+    """
+    Compare memory and throughput of one BatteryEnv per site against a PortfolioEnv stepping
+    the whole fleet on a shared market feed.
+    """
+    for n_sites in (10, 100):
+        tracemalloc.start()
+        envs = [BatteryEnv(capacity=100 + site, data=data, backend='columnar') for site in range(n_sites)]
+        separate_memory = tracemalloc.get_traced_memory()[0]
+        del envs
+        tracemalloc.stop()
+        tracemalloc.start()
+        env = PortfolioEnv(100 + np.arange(n_sites), 50, 50, 50, data=data, backend='columnar')
+        portfolio_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print(f'{n_sites:>5} sites: separate envs {separate_memory / 2**20:8.1f}MB, portfolio {portfolio_memory / 2**20:6.1f}MB')
+
+    market_data = BatteryEnv(data=data, backend='columnar').market_data
+    steps = min(args.steps, len(market_data) - 1)
+    for n_sites in (1, 10, 100, 1000, 10000):
+        env = PortfolioEnv(100 + np.arange(n_sites) % 400, 50, 50, 50, data=market_data)
+        start = time.perf_counter()
+        run_portfolio(env, RollingAveragePolicy(), num_steps=steps)
+        elapsed = time.perf_counter() - start
+        print(f'{n_sites:>5} sites: {steps / elapsed:10,.0f} fleet steps/s, {n_sites * steps / elapsed:14,.0f} battery steps/s')
+
+
+def bench_runner(args, data):
+    """
+    Compare submissions per minute of launching evaluate.py for every submission against the
+    runner's pool of warm, sandboxed workers. Every submission is a copy of this repository's
+    policies and config.yaml.
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    tmp = os.path.dirname(data)
+    n_submissions = 16
+    submissions = []
+    for index in range(n_submissions):
+        submission = os.path.join(tmp, 'submissions', f'team_{index}')
+        shutil.copytree(os.path.join(repo, 'policies'), os.path.join(submission, 'policies'),
+                        ignore=shutil.ignore_patterns('__pycache__'))
+        shutil.copy(os.path.join(repo, 'config.yaml'), submission)
+        submissions.append(submission)
+    workers = min(os.cpu_count(), 4)
+
+    start = time.perf_counter()
+    for submission in submissions[:4]:
+        subprocess.run([sys.executable, os.path.join(repo, 'evaluate.py'), '--data', data, '--trials', str(args.trials)],
+                       cwd=submission, capture_output=True, check=True)
+    cold_rate = 4 / (time.perf_counter() - start) * 60
+    print(f'evaluate.py per submission: {cold_rate:8.1f} submissions/min')
+
+    # Includes starting and warming up the pool
+    start = time.perf_counter()
+    with Runner(data, 'columnar', args.trials, args.seed, workers, db_path=os.path.join(tmp, 'runner.sqlite')) as runner:
+        statuses = [result['status'] for result in runner.run(submissions)]
+    warm_rate = n_submissions / (time.perf_counter() - start) * 60
+    print(f'runner, {workers} warm workers: {warm_rate:8.1f} submissions/min ({statuses.count("ok")}/{n_submissions} ok)')
+
+
+def bench_plot(args, data):
+    """
+    Compare rendering a whole dataset-long episode at full resolution against the min/max
+    downsampled default, then batch-render trial CSVs in parallel.
+    """
+    tmp = os.path.dirname(data)
+    prices = pd.read_csv(data)['Market_Price'].to_numpy()
+    rng = np.random.default_rng(args.seed)
+    series = {'actions': random_actions(rng, len(prices)), 'profits': np.cumsum(rng.normal(size=len(prices))),
+              'socs': rng.uniform(0, 100, len(prices)), 'market_prices': prices}
+    for name, max_points in (('full resolution', len(prices)), ('downsampled', None)):
+        path = os.path.join(tmp, f'{name.replace(" ", "_")}.png')
+        start = time.perf_counter()
+        plot_results(**series, save_path=path, max_points=max_points)
+        print(f'{name:>16}: {time.perf_counter() - start:6.2f}s for {len(prices)} steps, {os.path.getsize(path) / 1e3:6.0f}kB')
+
+    runs_dir = os.path.join(tmp, 'results', 'run', 'runs')
+    os.makedirs(runs_dir)
+    for trial in range(16):
+        pd.DataFrame({'Actions': series['actions'], 'Profits': series['profits'], 'SoC': series['socs'],
+                      'Market Prices': prices}).to_csv(os.path.join(runs_dir, f'trial_{trial}.csv'), index=False)
+    for workers in sorted({1, os.cpu_count()}):
+        start = time.perf_counter()
+        written = plot_runs(os.path.join(runs_dir, '*.csv'), workers, overwrite=True)
+        print(f'{workers:>3} workers: {len(written) / (time.perf_counter() - start):6.1f} trial plots/s')
+
+
+def bench_stats(args, data):
+    """
+    Compare the peak memory and time of collecting every profit in a list, as evaluate.py did, against
+    the streaming ProfitStats, and report the relative error of the sketched quantiles.
+    """
+    rng = np.random.default_rng(args.seed)
+    steps = min(args.steps, 100000)
+    trials = [np.cumsum(rng.normal(0.1, 5, steps)) for _ in range(args.trials)]
+
+    def collect_list():
+        total_profits = []
+        for profits in trials:
+            total_profits.extend(profits.tolist())
+        return np.mean(total_profits), np.std(total_profits), np.quantile(total_profits, DEFAULT_QUANTILES)
+
+    def collect_streaming():
+        profit_stats = ProfitStats()
+        for profits in trials:
+            profit_stats.add_trial(profits.tolist())
+        return profit_stats.summary()
+
+    timings = {}
+    for name, collect in (('list', collect_list), ('streaming', collect_streaming)):
+        start = time.perf_counter()
+        result = collect()
+        elapsed = time.perf_counter() - start
+        # Measured separately, since tracing allocations slows everything down
+        tracemalloc.start()
+        collect()
+        timings[name] = (elapsed, tracemalloc.get_traced_memory()[1], result)
+        tracemalloc.stop()
+    expected_mean, expected_std, expected_quantiles = timings['list'][2]
+    summary = timings['streaming'][2]
+
+    print(f'{args.trials} trials x {steps} steps')
+    for name, (elapsed, peak_memory, _) in timings.items():
+        print(f'{name:>10}: {elapsed:6.2f}s, peak {peak_memory / 2**20:8.1f}MB')
+    print(f'mean difference {abs(summary["mean_profit"] - expected_mean):.3g}, std difference {abs(summary["std_profit"] - expected_std):.3g}')
+    for (name, value), expected in zip(summary['profit_quantiles'].items(), expected_quantiles):
+        print(f'{name}: {value:10.3f} vs exact {expected:10.3f}, relative error {abs(value - expected) / abs(expected):.4f}')
+
+
+def random_actions(rng, shape, charge_rate=50, discharge_rate=50):
+    """
+    Draw actions mixing partial, full-rate and zero charging and discharging, which drive batteries
+    into both the empty and the full clamp.
+    """
+    actions = rng.uniform(-discharge_rate, charge_rate, shape)
+    kind = rng.integers(0, 4, shape)
+    actions[kind == 1] = charge_rate
+    actions[kind == 2] = -discharge_rate
+    actions[(kind == 3) & (rng.random(shape) < 0.5)] = 0.0
+    return actions
+
+
+def bench_kernel(args, data):
+    """
+    Check that every battery kernel reproduces Battery and BatteryEnv.process_action bit for bit,
+    then compare their throughput on one long episode and on many episodes at once. Exits with an
+    error if any kernel differs; test_battery_kernel.py checks the same with pytest.
+    """
+    env = BatteryEnv(data=data, backend='columnar')
+    prices = env.market_prices()
+    rng = np.random.default_rng(args.seed)
+    kernels = [kernel for kernel in KERNELS if kernel != 'numba' or numba_available()]
+    if not numba_available():
+        print('numba is not installed, skipping the numba kernel')
+
+    # Reference episodes through the Battery class, with initial states of charge across the whole range
+    n_episodes, n_steps = 32, min(args.steps, len(prices))
+    actions = random_actions(rng, (n_episodes, n_steps))
+    episode_prices = np.stack([prices[start:start + n_steps] for start in rng.integers(0, len(prices) - n_steps + 1, n_episodes)])
+    initial_socs = np.linspace(0, 100, n_episodes)
+    expected_profits = np.empty((n_episodes, n_steps))
+    expected_socs = np.empty((n_episodes, n_steps))
+    for episode in range(n_episodes):
+        env.battery = Battery(100, 50, 50, initial_socs[episode])
+        total_profit = 0
+        for step, (action, price) in enumerate(zip(actions[episode].tolist(), episode_prices[episode].tolist())):
+            total_profit += env.process_action(action, price)
+            expected_profits[episode, step] = total_profit
+            expected_socs[episode, step] = env.battery.state_of_charge
+    mismatched = []
+    for kernel in kernels:
+        profits, socs = simulate_episodes(actions, episode_prices, initial_socs, 100, 50, 50, 0.9, kernel=kernel)
+        identical = np.array_equal(profits.view(np.int64), expected_profits.view(np.int64)) and \
+            np.array_equal(socs.view(np.int64), expected_socs.view(np.int64))
+        print(f'{kernel:>6}: {"bit-identical" if identical else "MISMATCH"} to Battery on {n_episodes} x {n_steps} steps')
+        if not identical:
+            mismatched.append(kernel)
+
+    for n_episodes in (1, args.trials):
+        actions = random_actions(rng, (n_episodes, n_steps))
+        timings = {}
+        for kernel in kernels:
+            simulate_episodes(actions[:, :10], prices[:10], 50.0, 100, 50, 50, kernel=kernel)  # Compile outside the timing
+            start = time.perf_counter()
+            simulate_episodes(actions, prices[:n_steps], 50.0, 100, 50, 50, kernel=kernel)
+            timings[kernel] = time.perf_counter() - start
+        print(f'{n_episodes:>5} episodes x {n_steps} steps: ' +
+              ', '.join(f'{kernel} {n_episodes * n_steps / elapsed:12,.0f} steps/s' for kernel, elapsed in timings.items()))
+    if mismatched:
+        sys.exit(f'MISMATCH: the {", ".join(mismatched)} kernel(s) differ from Battery')
+
+
+class GCMonitor:
+    def __init__(self):
+        """
+        Count garbage collections and time their pauses through gc.callbacks while active.
+        """
+        self.collections = [0, 0, 0]
+        self.pause = 0.0
+        self._start = None
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        else:
+            self.pause += time.perf_counter() - self._start
+            self.collections[info['generation']] += 1
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self._callback)
+
+
+def bench_alloc(args, data):
+    """
+    Compare garbage collections, GC pause time and throughput of the serial evaluation loop
+    with a fresh observation and info per step against the reused views of reuse_views=True.
+    Collections are triggered by allocations of container objects outliving their step, so
+    short-lived views mostly show up in steps/s rather than in the collection count.
+    """
+    cases = (('pandas', 'pandas', False), ('columnar', 'columnar', False), ('columnar reuse', 'columnar', True))
+    for name, backend, reuse_views in cases:
+        env = BatteryEnv(data=data, backend=backend, reuse_views=reuse_views)
+        start_step = max(0, len(env.market_data) - args.steps - 1)
+        gc.collect()
+        policy = RollingAveragePolicy()
+        with GCMonitor() as monitor:
+            start = time.perf_counter()
+            state, info = env.reset(start_step)
+            steps = 0
+            while state is not None:
+                state, info = env.step(policy.act(state, info))
+                steps += 1
+            elapsed = time.perf_counter() - start
+        print(f'{name:>14}: {steps / elapsed:10,.0f} steps/s, gen0/1/2 collections '
+              f'{"/".join(map(str, monitor.collections)):>12}, GC pauses {monitor.pause * 1e3:7.2f}ms')
+
+
+IMPORT_SNIPPET = '''
+import time, tracemalloc
+tracemalloc.start()
+start = time.perf_counter()
+from policies import policy_classes
+{lookup}
+elapsed = time.perf_counter() - start
+print(elapsed, tracemalloc.get_traced_memory()[1])
+'''
+
+
+def bench_import(args, data):
+    """
+    Compare the startup time and peak memory of looking up one policy class through the lazy
+    registry against importing every policy module, each in a fresh interpreter. Memory is
+    the peak traced by tracemalloc, which also slows both cases down equally.
+    """
+    cases = {
+        'lazy lookup': "policy_classes['RandomActionPolicy']",
+        'import all': 'dict(policy_classes.items())',
+    }
+    for name, lookup in cases.items():
+        runs = [subprocess.run([sys.executable, '-c', IMPORT_SNIPPET.format(lookup=lookup)], capture_output=True,
+                               text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+                for _ in range(5)]
+        elapsed = min(float(run[0]) for run in runs)
+        peak_memory = min(int(run[1]) for run in runs)
+        print(f'{name:>12}: {elapsed * 1e3:8.1f}ms, peak allocated {peak_memory / 2**20:6.1f}MB')
+
+
+BENCHMARKS = {
+    'alloc': bench_alloc,
+    'cache': bench_cache,
+    'env': bench_env,
+    'import': bench_import,
+    'kernel': bench_kernel,
+    'plot': bench_plot,
+    'portfolio': bench_portfolio,
+    'rolling': bench_rolling,
+    'runner': bench_runner,
+    'stats': bench_stats,
+    'vector': bench_vector,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the battery simulation hot paths.')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='Benchmark to run')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Standard dataset size: small (30 days), '
+                        'medium (1 year) or large (3 years); --days overrides it')
+    parser.add_argument('--days', type=int, help='Days of synthetic 5-minute market data (default 365)')
+    parser.add_argument('--region', type=str, default='NSW1', choices=sorted(REGIONS), help='Region of the synthetic data')
+    parser.add_argument('--steps', type=int, default=20000, help='Environment steps to time')
+    parser.add_argument('--trials', type=int, default=100, help='Number of trials for trial-level benchmarks')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data and trial sampling')
+    args = parser.parse_args()
+    if args.days is None:
+        args.days = PRESETS[args.preset]['days'] if args.preset else 365
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'market.csv')
+        rows = make_dataset(data, days=args.days, seed=args.seed, region=args.region)
+        print(f'Synthetic dataset: {rows} rows ({args.days} days of {args.region})')
+        BENCHMARKS[args.benchmark](args, data)
+
+
+if __name__ == '__main__':
+    main()
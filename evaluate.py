@@ -1,25 +1,34 @@
 import argparse
+import copy
 import yaml
 import os
-import random
-import pandas as pd
 from policies import policy_classes
 from battery_env import BatteryEnv
+from market_data import BACKENDS
+from vector_env import VectorBatteryEnv, is_stateful, run_trials
+from oracle import oracle_for_env
+from results_writer import RESULTS_FORMATS, ResultsWriter, parquet_available
+from profiling import Profiler
+from trial_plan import TrialPlan, set_seed
+from feature_store import FeatureStore
+from stats import ProfitStats
 from datetime import datetime
 import numpy as np
 import tqdm
 import json
+import multiprocessing
 
 def load_config(file_path):
     with open(file_path, 'r') as file:
         return yaml.safe_load(file)['policy']
 
-def set_seed(seed):
-    random.seed(seed)
-    np.random.seed(seed)
+def run_trial(env, policy, start_step, episode_length, initial_soc=None, replay=False):
+    state, info = env.reset(start_step=start_step, episode_length=episode_length, initial_soc=initial_soc)
+    # act_vectorized sees the episode's future prices, so it is only used when asked for
+    if replay and hasattr(policy, 'act_vectorized'):
+        actions = policy.act_vectorized(env.market_prices(start_step), env.battery_params())
+        return env.simulate(actions)
 
-def run_trial(env, policy, start_step, episode_length):
-    state, info = env.reset(start_step=start_step, episode_length=episode_length)
     actions, profits, socs, market_prices = [], [], [], []
 
     while True:
@@ -36,6 +45,48 @@ def run_trial(env, policy, start_step, episode_length):
 
     return actions, profits, socs, market_prices
 
+def serial_trials(env, policy, plan, replay=False):
+    for entry in plan:
+        yield run_trial(env, policy, *plan.start_trial(entry), replay=replay)
+
+_worker_state = {}
+# Trials stepped in lockstep at a time by --vectorized
+VECTOR_BATCH_SIZE = 256
+# Trials waiting for the results writer; bounded so a fast trial loop cannot pile up every trial's series
+RESULTS_QUEUE_SIZE = 64
+
+def _init_worker(policy_config, data, backend, plan, features, reuse_views, replay):
+    # Each worker loads the market data and imports the policy class once, then serves many trials
+    _worker_state['env'] = BatteryEnv(data=data, backend=backend, reuse_views=reuse_views)
+    if features:
+        _worker_state['env'].attach_features(FeatureStore.cached(data, _worker_state['env'].market_data))
+    _worker_state['policy_class'] = policy_classes[policy_config['class_name']]
+    _worker_state['parameters'] = policy_config.get('parameters', {})
+    _worker_state['plan'] = plan
+    _worker_state['replay'] = replay
+
+def _run_worker_trial(trial):
+    # A fresh policy per trial, so results do not depend on which worker runs which trial
+    plan = _worker_state['plan']
+    policy = _worker_state['policy_class'](**_worker_state['parameters'])
+    return run_trial(_worker_state['env'], policy, *plan.start_trial(plan[trial]), replay=_worker_state['replay'])
+
+def parallel_trials(policy_config, data, backend, plan, workers, features=False, reuse_views=False, replay=False):
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(policy_config, data, backend, plan, features, reuse_views, replay)) as pool:
+        # imap yields results in trial order while later trials are still running
+        yield from pool.imap(_run_worker_trial, range(len(plan)))
+
+def vectorized_trials(env, policy, plan, batch_size=VECTOR_BATCH_SIZE):
+    # Lockstep batches of trials, so only one batch's series are held at a time whatever the number
+    # of trials. Each batch gets a fresh copy of the policy, as every trial starts from a fresh state.
+    for start in range(0, len(plan), batch_size):
+        entries = plan.entries[start:start + batch_size]
+        vector_env = VectorBatteryEnv(len(entries), data=env.market_data)
+        initial_socs = plan.initial_socs(vector_env.initial_charge)[start:start + batch_size]
+        yield from run_trials(vector_env, copy.deepcopy(policy), entries['start_step'], entries['episode_length'],
+                              initial_socs)
+
 def parse_parameters(params_list):
     params = {}
     for item in params_list:
@@ -50,7 +101,43 @@ def main():
     parser.add_argument('--data', type=str, default='train.csv', help='Path to the market data csv file')
     parser.add_argument('--class_name', type=str, help='Policy class name. If not provided, the config.yaml policy will be used.')
     parser.add_argument('--param', action='append', help='Policy parameters as key=value pairs', default=[])
+    parser.add_argument('--backend', type=str, default='pandas', choices=BACKENDS, help='Market data backend')
+    parser.add_argument('--vectorized', action='store_true',
+                        help='Step all trials in lockstep with VectorBatteryEnv. Every trial starts from a fresh policy state, '
+                             'while the serial loop carries one policy instance (e.g. its price window) across trials, so '
+                             'stateful policies score differently. Stochastic policies also draw random numbers in a different order.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes to spread trials across. Every trial starts from a fresh policy '
+                             'instance, as with --vectorized, so results do not depend on scheduling but stateful '
+                             'policies score differently from the serial loop.')
+    parser.add_argument('--results_format', type=str, default='csv', choices=RESULTS_FORMATS,
+                        help='Write one CSV per trial, or all trials to a single results.npz or results.parquet')
+    parser.add_argument('--profile', action='store_true',
+                        help='Record per-phase latencies of the serial trial loop and write profile_stats.yaml')
+    parser.add_argument('--plan', type=str, help='Path to a saved trial plan (trial_plan.npz) to evaluate on instead of sampling trials')
+    parser.add_argument('--soc_range', type=str, help='Draw each trial\'s initial state of charge uniformly from LOW,HIGH kWh')
+    parser.add_argument('--features', action='store_true',
+                        help='Attach the shared precomputed features, passed to policies as info[\'features\']')
+    parser.add_argument('--oracle', action='store_true', help='Report regret against the optimal achievable profit of each trial')
+    parser.add_argument('--bootstrap', type=int, default=10000,
+                        help='Number of bootstrap resamples for the confidence interval of the mean final profit')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the bootstrap interval')
+    parser.add_argument('--reuse_views', action='store_true',
+                        help='Update one observation and info object in place every step instead of allocating new ones')
+    parser.add_argument('--replay', action='store_true',
+                        help='Let policies that define act_vectorized decide each episode in one pass. They see the '
+                             'episode\'s future prices, so only use this for trusted policies.')
     args = parser.parse_args()
+    if args.profile and (args.vectorized or args.workers > 1):
+        parser.error('--profile instruments the serial trial loop and cannot be combined with --vectorized or --workers')
+    if args.results_format == 'parquet' and not parquet_available():
+        parser.error("--results_format parquet requires pyarrow; install it or use --results_format npz")
+    if args.vectorized and args.backend == 'chunked':
+        parser.error('--vectorized needs whole columns in memory; use --backend columnar or cached, not chunked')
+    if args.features and args.vectorized:
+        parser.error('--features is not supported by the vectorized environment')
+    if args.replay and args.vectorized:
+        parser.error('--replay applies to the serial and worker trial loops, not --vectorized')
 
     if args.class_name:
         policy_config = {'class_name': args.class_name, 'parameters': parse_parameters(args.param)}
@@ -59,7 +146,17 @@ def main():
 
     policy_class = policy_classes[policy_config['class_name']]
     policy = policy_class(**policy_config.get('parameters', {}))
-    env = BatteryEnv(data=args.data)
+    env = BatteryEnv(data=args.data, backend=args.backend, reuse_views=args.reuse_views)
+    if args.features:
+        env.attach_features(FeatureStore.cached(args.data, env.market_data))
+
+    if args.plan:
+        plan = TrialPlan.load(args.plan)
+        plan.check(len(env.market_data))
+        args.trials = len(plan)
+    else:
+        soc_range = tuple(float(value) for value in args.soc_range.split(',')) if args.soc_range else None
+        plan = TrialPlan.cached(args.data, len(env.market_data), args.trials, args.seed, soc_range)
 
     print(f'Running {args.trials} trials with policy {policy_config["class_name"]} and parameters {policy_config.get("parameters", {})}')
 
@@ -67,36 +164,68 @@ def main():
     os.makedirs(results_dir, exist_ok=True)
     runs_dir = os.path.join(results_dir, 'runs')
     os.makedirs(runs_dir, exist_ok=True)
+    plan.save(os.path.join(results_dir, 'trial_plan.npz'))
 
     set_seed(args.seed)
 
-    total_profits = []
-    for trial in tqdm.tqdm(range(args.trials)):
-        set_seed(args.seed + trial)
+    profiler = Profiler().instrument(env, policy) if args.profile else None
+
+    if (args.vectorized or args.workers > 1) and is_stateful(policy):
+        flag = '--vectorized' if args.vectorized else '--workers'
+        print(f'Warning: {policy_config["class_name"]} keeps state between steps. With {flag} every trial starts '
+              f'from a fresh state, unlike the serial loop, so scores differ from a run without {flag}.')
 
-        start_step = random.randint(0, len(env.market_data) - 1)
-        episode_length = random.randint(1, len(env.market_data) - start_step)
-        actions, profits, socs, market_prices = run_trial(env, policy, start_step, episode_length)
-        total_profits.extend(profits)
+    if args.vectorized:
+        trial_results = vectorized_trials(env, policy, plan)
+    elif args.workers > 1:
+        trial_results = parallel_trials(policy_config, args.data, args.backend, plan, args.workers, args.features,
+                                        args.reuse_views, args.replay)
+    else:
+        trial_results = serial_trials(env, policy, plan, args.replay)
+
+    profit_stats = ProfitStats()
+    with ResultsWriter(runs_dir, args.results_format, max_queue=RESULTS_QUEUE_SIZE) as writer:
+        for trial, (actions, profits, socs, market_prices) in enumerate(tqdm.tqdm(trial_results, total=args.trials)):
+            profit_stats.add_trial(profits)
+            writer.submit(trial, {'Actions': actions, 'Profits': profits, 'SoC': socs, 'Market Prices': market_prices})
 
-        results_df = pd.DataFrame({'Actions': actions, 'Profits': profits, 'SoC': socs, 'Market Prices': market_prices})
-        results_df.to_csv(os.path.join(runs_dir, f'trial_{trial}.csv'), index=False)
+    if profiler is not None:
+        profiler.stop()
 
-    avg_profit = float(np.mean(total_profits))
-    std_profit = float(np.std(total_profits))
+    summary = profit_stats.summary(n_resamples=args.bootstrap, confidence=args.confidence, seed=args.seed)
+    avg_profit = summary['mean_profit']
+    std_profit = summary['std_profit']
 
     config_stats = {
         'class_name': policy_config['class_name'],
         'parameters': policy_config.get('parameters', {}),
-        'mean_profit': avg_profit,
-        'std_profit': std_profit,
+        **summary,
         'num_runs': args.trials
     }
 
     print(f'Average profit ($): {avg_profit:.2f} ± {std_profit:.2f}')
+    print(f'Mean final profit ($): {summary["mean_final_profit"]:.2f}, '
+          f'{args.confidence:.0%} CI [{summary["final_profit_ci_low"]:.2f}, {summary["final_profit_ci_high"]:.2f}]')
+
+    if args.oracle:
+        initial_socs = plan.initial_socs(env.battery.initial_charge)
+        optimal_profits = oracle_for_env(env).optimal_profits(plan.entries['start_step'], initial_socs)
+        regrets = optimal_profits - profit_stats.final_profits
+        config_stats['mean_oracle_profit'] = float(np.mean(optimal_profits))
+        config_stats['mean_regret'] = float(np.mean(regrets))
+        config_stats['std_regret'] = float(np.std(regrets))
+        print(f'Average regret vs oracle ($): {config_stats["mean_regret"]:.2f} ± {config_stats["std_regret"]:.2f}')
 
     with open(os.path.join(results_dir, 'config_stats.yaml'), 'w') as file:
         yaml.dump(config_stats, file, default_flow_style=False)
 
+    if profiler is not None:
+        profile_stats = profiler.summary()
+        for phase, stats in profile_stats['phases'].items():
+            print(f'{phase:>22}: p50 {stats["p50_us"]:8.2f}us  p99 {stats["p99_us"]:8.2f}us  ({stats["calls"]} calls)')
+        print(f'Steps per second: {profile_stats["steps_per_sec"]:,.0f}')
+        with open(os.path.join(results_dir, 'profile_stats.yaml'), 'w') as file:
+            yaml.dump(profile_stats, file, default_flow_style=False)
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Shared, precomputed features for policies.
+
+Many policies derive the same signals from the market data on every step: rolling means and
+volatility of the price, lagged prices, time-of-day buckets parsed from the timestamp. A
+FeatureStore computes these columns once per dataset with vectorized NumPy, caches them on disk
+keyed by the CSV's content hash, and is attached to a BatteryEnv so policies receive the
+current row as ``info['features']``.
+
+Every feature at a step depends only on that step and earlier ones, so nothing leaks from the
+future rows of the market data. Rolling statistics use however many rows are available at the
+start of the data; lags before the start of the data are NaN.
+"""
+
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from market_data import DEFAULT_CACHE_DIR, ColumnarMarketData, MarketRow, file_digest
+
+DEFAULT_FEATURE_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), 'features')
+DEFAULT_WINDOWS = (12, 288)  # One hour and one day of 5-minute intervals
+DEFAULT_LAGS = (1, 12, 288)
+
+
+def _market_columns(market_data, names):
+    """
+    Return whole columns of any market data source as float or string arrays.
+    """
+    if isinstance(market_data, pd.DataFrame):
+        return {name: market_data[name].to_numpy() for name in names}
+    if isinstance(market_data, ColumnarMarketData):
+        return {name: market_data.column(name) for name in names}
+    # Streamed sources are read chunk by chunk, keeping only the requested columns
+    parts = {name: [] for name in names}
+    for chunk in market_data.iter_chunks():
+        for name in names:
+            parts[name].append(chunk.column(name).copy())
+    return {name: np.concatenate(values) for name, values in parts.items()}
+
+
+def trailing_mean(values, window):
+    """
+    Mean of each value and up to window - 1 values before it.
+    """
+    # Shift by the first value, which is known at every step, to reduce cancellation in the cumsum
+    shifted = values - values[0]
+    sums = np.cumsum(shifted)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return sums / counts + values[0]
+
+
+def trailing_std(values, window):
+    """
+    Population standard deviation of each value and up to window - 1 values before it.
+    """
+    shifted = values - values[0]
+    mean = trailing_mean(shifted, window)
+    mean_square = trailing_mean(shifted * shifted, window)
+    return np.sqrt(np.maximum(mean_square - mean * mean, 0))
+
+
+def lagged(values, lag):
+    """
+    The value lag steps earlier, NaN where that is before the start of the data.
+    """
+    result = np.full(len(values), np.nan)
+    result[lag:] = values[:len(values) - lag]
+    return result
+
+
+class FeatureStore:
+    def __init__(self, features):
+        """
+        :param features: Dictionary mapping feature names to arrays with one value per market data row.
+        """
+        self.features = {name: np.asarray(values) for name, values in features.items()}
+        for values in self.features.values():
+            values.flags.writeable = False
+
+    @classmethod
+    def compute(cls, market_data, windows=DEFAULT_WINDOWS, lags=DEFAULT_LAGS):
+        """
+        Compute the features of a market data source.
+
+        :param market_data: DataFrame or market data source with the train.csv columns.
+        :param windows: Window sizes in steps of the rolling means and standard deviations.
+        :param lags: Lags in steps of the lagged prices.
+        """
+        columns = _market_columns(market_data, ['Timestamp', 'Market_Price', 'Energy_Demand', 'Temperature'])
+        prices = np.asarray(columns['Market_Price'], dtype=float)
+        demand = np.asarray(columns['Energy_Demand'], dtype=float)
+        temperature = np.asarray(columns['Temperature'], dtype=float)
+        timestamps = pd.to_datetime(pd.Series(columns['Timestamp']))
+
+        features = {
+            'hour': timestamps.dt.hour.to_numpy(dtype=float),
+            'day_of_week': timestamps.dt.dayofweek.to_numpy(dtype=float),
+            # Five buckets: night, morning, midday, evening peak, late evening
+            'time_of_day_bucket': np.digitize(timestamps.dt.hour.to_numpy(), [6, 10, 16, 21]).astype(float),
+        }
+        for window in windows:
+            features[f'price_mean_{window}'] = trailing_mean(prices, window)
+            features[f'price_std_{window}'] = trailing_std(prices, window)
+            features[f'demand_mean_{window}'] = trailing_mean(demand, window)
+            features[f'temperature_mean_{window}'] = trailing_mean(temperature, window)
+        for lag in lags:
+            features[f'price_lag_{lag}'] = lagged(prices, lag)
+        return cls(features)
+
+    @classmethod
+    def cached(cls, data, market_data, windows=DEFAULT_WINDOWS, lags=DEFAULT_LAGS, feature_dir=DEFAULT_FEATURE_DIR):
+        """
+        Load the features of a dataset from the feature cache, computing and saving them on first use.
+
+        :param data: Path to the market data CSV; its content hash keys the cache.
+        :param market_data: The loaded market data of that CSV.
+        :param windows: Window sizes in steps of the rolling statistics.
+        :param lags: Lags in steps of the lagged prices.
+        :param feature_dir: Directory holding cached features.
+        """
+        spec = hashlib.sha256(json.dumps({'windows': list(windows), 'lags': list(lags)}).encode()).hexdigest()[:16]
+        path = os.path.join(feature_dir, f'{file_digest(data)}_{spec}.npz')
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                return cls({name: cached[name] for name in cached.files})
+        store = cls.compute(market_data, windows, lags)
+        os.makedirs(feature_dir, exist_ok=True)
+        np.savez(path, **store.features)
+        return store
+
+    def __len__(self):
+        return len(next(iter(self.features.values()), ()))
+
+    @property
+    def names(self):
+        return list(self.features)
+
+    def row(self, step):
+        """
+        Return a read-only view of the features at a step.
+
+        :param step: Index of the row.
+        """
+        return MarketRow(self.features, step)
@@ -0,0 +1,313 @@
+"""
+Feed-driven live mode for load-testing policies without the network.
+
+ReplayServer stands in for the live market feed: it serves rows of a train.csv-format file over
+a local TCP socket as newline-delimited JSON, one row per 5-minute dispatch interval, sped up by
+a configurable factor. LiveBatteryEnv connects to it with asyncio and drives a policy the way the
+live tranche will: observations arrive on the feed's clock whether or not the policy is ready.
+
+- Received observations go into a bounded queue. When the policy falls behind and the queue is
+  full, the oldest observation is dropped, since a stale price is of no use to a live dispatcher.
+- policy.act runs in a daemon thread with a deadline, by default one (sped up) interval. A policy
+  that misses the deadline is charged the default action for that interval, and later intervals
+  also get the default action until the late call returns, so a policy never runs concurrently
+  with itself. The late result is discarded.
+- Every interval records its end-to-end decision latency, from the server sending the
+  observation to the action being applied, and whether the deadline was missed.
+
+As in BatteryEnv, the action chosen for an observation is settled at that observation's price,
+and the last observation of the feed only ends the episode. With no missed deadlines or dropped
+observations the profits match an offline BatteryEnv run over the same rows.
+
+Example:
+    python live_env.py --class_name RollingAveragePolicy --speedup 1000 --steps 288
+    python live_env.py --serve --port 8765 --speedup 1000        # Feed only
+    python live_env.py --connect 127.0.0.1:8765 --class_name RandomActionPolicy
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from battery_env import Battery, BatteryEnv, StepInfo
+from market_data import BACKENDS, open_market_data
+from policies import policy_classes
+
+INTERVAL_MINUTES = 5
+
+
+def _json_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _run_in_daemon_thread(loop, function, *args):
+    """
+    Call a function in a new daemon thread and return an asyncio future of its result. Unlike an
+    executor's worker thread, a daemon thread stuck in a call that never returns does not keep
+    the interpreter from exiting.
+    """
+    future = loop.create_future()
+
+    def settle(method, value):
+        if not future.done():
+            method(value)
+
+    def run():
+        try:
+            callback = (settle, future.set_result, function(*args))
+        except BaseException as error:
+            callback = (settle, future.set_exception, error)
+        try:
+            loop.call_soon_threadsafe(*callback)
+        except RuntimeError:
+            pass  # The event loop has closed; the late result is discarded
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class ReplayServer:
+    def __init__(self, data='train.csv', speedup=1000.0, start_step=0, num_steps=None, backend='columnar',
+                 host='127.0.0.1', port=0):
+        """
+        Local TCP server replaying market data rows at a multiple of real time.
+
+        :param data: Path to the CSV file containing market data, or already loaded market data.
+        :param speedup: Replay speed relative to real time; 1000 sends a 5-minute interval every 0.3s.
+        :param start_step: First row to serve.
+        :param num_steps: Number of rows to serve; defaults to the end of the data.
+        :param backend: Market data backend used when data is a path.
+        :param host: Interface to listen on.
+        :param port: Port to listen on; 0 picks a free port, see the port attribute once started.
+        """
+        self.market_data = open_market_data(data, backend)
+        if isinstance(self.market_data, pd.DataFrame):
+            self._row = lambda step: self.market_data.iloc[step].to_dict()
+        else:
+            self._row = self.market_data.row
+        self.interval = INTERVAL_MINUTES * 60 / speedup
+        self.start_step = start_step
+        stop = len(self.market_data) if num_steps is None else min(start_step + num_steps, len(self.market_data))
+        self.stop_step = stop
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _serve(self, reader, writer):
+        # Every client gets the whole feed, paced against absolute send times so delays do not accumulate
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            for index, step in enumerate(range(self.start_step, self.stop_step)):
+                await asyncio.sleep(max(started + index * self.interval - loop.time(), 0))
+                message = {
+                    'step': step,
+                    'remaining_steps': len(self.market_data) - step - 1,
+                    'sent_ns': time.time_ns(),
+                    'observation': {name: _json_value(value) for name, value in self._row(step).items()},
+                }
+                writer.write(json.dumps(message).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass  # The client went away
+        finally:
+            writer.close()
+
+
+class LiveBatteryEnv:
+    # Settle actions exactly as BatteryEnv does
+    process_action = BatteryEnv.process_action
+
+    def __init__(self, capacity=100, charge_rate=50, discharge_rate=50, initial_charge=50, default_action=0.0,
+                 timeout=None, queue_size=4):
+        """
+        Battery driven by observations arriving from a replay server or live feed.
+
+        :param capacity: Maximum capacity of the battery in kWh.
+        :param charge_rate: Maximum charging rate of the battery in kW.
+        :param discharge_rate: Maximum discharging rate of the battery in kW.
+        :param initial_charge: Initial state of charge of the battery in kWh.
+        :param default_action: Action applied when the policy misses its deadline.
+        :param timeout: Deadline in seconds for policy.act; defaults to the feed's interval.
+        :param queue_size: Maximum number of observations waiting for the policy.
+        """
+        self.battery = Battery(capacity, charge_rate, discharge_rate, initial_charge)
+        self.default_action = default_action
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.total_profit = 0
+        self.dropped = 0
+
+    async def _receive(self, reader, queue):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(message)
+        await queue.put(None)
+
+    async def run(self, policy, host, port, interval=None):
+        """
+        Connect to a feed and run the policy until the feed ends.
+
+        :param policy: Policy instance; act is called from a daemon thread.
+        :param host: Host of the feed.
+        :param port: Port of the feed.
+        :param interval: Feed interval in seconds, the default deadline when no timeout is set.
+        :return: DataFrame with one row per interval: step, price, action, whether the deadline was
+                 missed, the policy's decision time, end-to-end latency, queue depth, profit and state of charge.
+        """
+        timeout = self.timeout if self.timeout is not None else interval
+        reader, writer = await asyncio.open_connection(host, port)
+        queue = asyncio.Queue(self.queue_size)
+        receiver = asyncio.create_task(self._receive(reader, queue))
+        loop = asyncio.get_running_loop()
+
+        records = []
+        pending = None
+        self.battery.reset()
+        self.total_profit = 0
+        self.dropped = 0
+        profit_delta = 0
+        try:
+            while True:
+                message = await queue.get()
+                if message is None or message['remaining_steps'] == 0:
+                    break  # The last observation of the data only ends the episode
+                observation = message['observation']
+                info = StepInfo(self.total_profit, profit_delta, self.battery.state_of_charge, self.battery.charge_rate,
+                                self.battery.discharge_rate, message['remaining_steps'])
+
+                decision_start = time.perf_counter_ns()
+                missed = True
+                action = self.default_action
+                if pending is None or pending.done():
+                    pending = _run_in_daemon_thread(loop, policy.act, observation, info)
+                    try:
+                        action = await asyncio.wait_for(asyncio.shield(pending), timeout)
+                        missed = False
+                    except asyncio.TimeoutError:
+                        pass  # Keeps running; later intervals get the default action until it returns
+                decision_ns = time.perf_counter_ns() - decision_start
+
+                profit_delta = self.process_action(action, observation['Market_Price'])
+                self.total_profit += profit_delta
+                records.append({
+                    'step': message['step'],
+                    'market_price': observation['Market_Price'],
+                    'action': action,
+                    'missed_deadline': missed,
+                    'decision_us': decision_ns / 1e3,
+                    'latency_us': (time.time_ns() - message['sent_ns']) / 1e3,
+                    'queue_depth': queue.qsize(),
+                    'total_profit': self.total_profit,
+                    'battery_soc': self.battery.state_of_charge,
+                })
+        finally:
+            receiver.cancel()
+            writer.close()
+        return pd.DataFrame(records)
+
+
+def latency_summary(intervals, dropped=0):
+    """
+    Summarize the per-interval records returned by LiveBatteryEnv.run.
+    """
+    latency = intervals['latency_us'].to_numpy()
+    p50, p99 = np.percentile(latency, [50, 99]) if len(latency) else (0.0, 0.0)
+    return {
+        'intervals': int(len(intervals)),
+        'missed_deadlines': int(intervals['missed_deadline'].sum()) if len(intervals) else 0,
+        'dropped_observations': int(dropped),
+        'latency_p50_us': float(p50),
+        'latency_p99_us': float(p99),
+        'latency_max_us': float(latency.max()) if len(latency) else 0.0,
+        'total_profit': float(intervals['total_profit'].iloc[-1]) if len(intervals) else 0.0,
+    }
+
+
+async def run_live(policy, data='train.csv', speedup=1000.0, start_step=0, num_steps=None, backend='columnar',
+                   connect=None, **env_kwargs):
+    """
+    Run a policy against a replay server started in the same event loop, or an existing feed.
+
+    :param connect: (host, port) of a running feed; by default a local ReplayServer is started.
+    :param env_kwargs: Further arguments of LiveBatteryEnv.
+    :return: Per-interval records and the LiveBatteryEnv.
+    """
+    env = LiveBatteryEnv(**env_kwargs)
+    interval = INTERVAL_MINUTES * 60 / speedup
+    if connect is not None:
+        return await env.run(policy, *connect, interval=interval), env
+    server = await ReplayServer(data, speedup, start_step, num_steps, backend).start()
+    try:
+        return await env.run(policy, server.host, server.port, interval=interval), env
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a policy against a replayed live market feed.')
+    parser.add_argument('--class_name', type=str, default='RollingAveragePolicy', help='Policy class name')
+    parser.add_argument('--data', type=str, default='train.csv', help='Path to the market data csv file to replay')
+    parser.add_argument('--backend', type=str, default='columnar', choices=BACKENDS, help='Market data backend')
+    parser.add_argument('--speedup', type=float, default=1000.0, help='Replay speed relative to real time')
+    parser.add_argument('--start_step', type=int, default=0, help='First row of the data to replay')
+    parser.add_argument('--steps', type=int, help='Number of rows to replay; defaults to the end of the data')
+    parser.add_argument('--timeout', type=float, help='Deadline for policy.act in seconds; defaults to one replayed interval')
+    parser.add_argument('--default_action', type=float, default=0.0, help='Action applied when the policy misses its deadline')
+    parser.add_argument('--queue_size', type=int, default=4, help='Maximum number of observations waiting for the policy')
+    parser.add_argument('--serve', action='store_true', help='Only run the replay server')
+    parser.add_argument('--port', type=int, default=8765, help='Port of the replay server with --serve')
+    parser.add_argument('--connect', type=str, help='HOST:PORT of a running feed to connect to instead of a local server')
+    args = parser.parse_args()
+
+    if args.serve:
+        server = ReplayServer(args.data, args.speedup, args.start_step, args.steps, args.backend, port=args.port)
+        print(f'Replaying {args.data} on port {args.port} at {args.speedup:g}x')
+        asyncio.run(server.serve_forever())
+        return
+
+    connect = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        connect = (host, int(port))
+    policy = policy_classes[args.class_name]()
+    intervals, env = asyncio.run(run_live(policy, args.data, args.speedup, args.start_step, args.steps, args.backend,
+                                          connect, default_action=args.default_action, timeout=args.timeout,
+                                          queue_size=args.queue_size))
+    summary = latency_summary(intervals, env.dropped)
+    for key, value in summary.items():
+        print(f'{key}: {value:,.2f}' if isinstance(value, float) else f'{key}: {value}')
+
+    results_dir = os.path.join('results', f'{datetime.now().strftime("%Y%m%d_%H%M%S")}_live_{args.class_name}')
+    os.makedirs(results_dir, exist_ok=True)
+    intervals.to_csv(os.path.join(results_dir, 'intervals.csv'), index=False)
+
+
+if __name__ == '__main__':
+    main()
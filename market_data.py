@@ -0,0 +1,363 @@
+"""
+Market data sources for the battery simulation environment.
+
+By default BatteryEnv reads the market CSV into a pandas DataFrame and looks up a row with
+``iloc`` on every step, which builds a fresh Series each time. The columnar source in this
+module converts the CSV once into contiguous NumPy arrays and hands policies a lightweight
+read-only row view that still supports ``market_observation.get('Market_Price')``.
+
+The cached backend additionally stores the converted columns as ``.npy`` files keyed by the
+SHA-256 of the CSV contents. Later loads memory-map those files instead of parsing the CSV,
+so repeated environments and worker processes share the same pages of the OS page cache. Any
+backend also accepts a path to a directory in the same layout, as written by synthetic_data.py.
+
+The chunked backend never holds more than a few chunks of the CSV in memory. It indexes the
+byte offset of every chunk in one streaming pass and parses chunks on demand, which keeps
+memory bounded for multi-year files while still supporting random ``reset(start_step=...)``.
+"""
+
+from collections import OrderedDict
+from collections.abc import Mapping
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+BACKENDS = ('pandas', 'columnar', 'cached', 'chunked')
+DEFAULT_CACHE_DIR = os.path.join('.cache', 'market_data')
+DEFAULT_CHUNK_SIZE = 30 * 288  # 30 days of 5-minute intervals
+
+
+class MarketRow(Mapping):
+    __slots__ = ('_columns', '_step')
+
+    def __init__(self, columns, step):
+        """
+        Read-only view of a single row of columnar market data.
+
+        :param columns: Dictionary mapping column names to NumPy arrays.
+        :param step: Index of the row within the arrays.
+        """
+        self._columns = columns
+        self._step = step
+
+    def __getitem__(self, key):
+        return self._columns[key][self._step]
+
+    def get(self, key, default=None):
+        column = self._columns.get(key)
+        if column is None:
+            return default
+        return column[self._step]
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return f'MarketRow({dict(self)!r})'
+
+    def seek(self, step):
+        """
+        Point the view at another row, for callers that reuse one view across steps.
+
+        :param step: Index of the row within the arrays.
+        :return: The view itself.
+        """
+        self._step = step
+        return self
+
+
+class ColumnarMarketData:
+    def __init__(self, columns):
+        """
+        Market data held as one contiguous NumPy array per column.
+
+        :param columns: Dictionary mapping column names to equal-length arrays.
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f'All market data columns must have the same length, got {sorted(lengths)}')
+        self._columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+        for values in self._columns.values():
+            values.flags.writeable = False
+        self._length = lengths.pop() if lengths else 0
+        self._prices = self._columns['Market_Price']
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """
+        Build a columnar source from a DataFrame. Text columns such as 'Timestamp' are stored
+        as fixed-width unicode arrays so every column is a plain, non-object NumPy array.
+
+        :param df: DataFrame with one column per market variable.
+        """
+        columns = {}
+        for name in df.columns:
+            values = df[name].to_numpy()
+            if values.dtype == object or not np.issubdtype(values.dtype, np.number):
+                values = values.astype(str)
+            columns[name] = values
+        return cls(columns)
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Load a market data CSV into a columnar source.
+
+        :param path: Path to the CSV file containing market data.
+        """
+        return cls.from_dataframe(pd.read_csv(path))
+
+    @classmethod
+    def from_directory(cls, path):
+        """
+        Memory-map a directory holding one ``.npy`` file per column and a ``columns.json``
+        manifest, the layout of the binary cache and of synthetic_data.py's binary output.
+
+        :param path: Path to the directory.
+        """
+        with open(os.path.join(path, 'columns.json')) as file:
+            names = json.load(file)
+        return cls({name: np.load(os.path.join(path, f'{i}.npy'), mmap_mode='r') for i, name in enumerate(names)})
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        """
+        Return the read-only array backing a column.
+
+        :param name: Name of the column, e.g. 'Market_Price'.
+        """
+        return self._columns[name]
+
+    def row(self, step):
+        """
+        Return a read-only view of the market observation at a step.
+
+        :param step: Index of the row.
+        """
+        if step < 0:
+            step += self._length
+        if not 0 <= step < self._length:
+            raise IndexError(f'Step {step} is out of bounds for market data of length {self._length}')
+        return MarketRow(self._columns, step)
+
+    def price(self, step):
+        """
+        Return the market price at a step.
+
+        :param step: Index of the row.
+        """
+        return self._prices[step]
+
+    def prices(self, start=0, stop=None):
+        """
+        Return the market prices of a range of steps as a read-only array view.
+
+        :param start: First step of the range.
+        :param stop: Step after the last one of the range; defaults to the end of the data.
+        """
+        return self._prices[start:stop]
+
+
+class ChunkedMarketData:
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE, max_chunks=2):
+        """
+        Market data streamed from a CSV file in fixed-size chunks of rows.
+
+        :param path: Path to the CSV file containing market data.
+        :param chunk_size: Number of rows per chunk.
+        :param max_chunks: Number of parsed chunks kept in memory at once.
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self._chunks = OrderedDict()
+        self._columns, self._offsets, self._length = self._build_index()
+
+    def _build_index(self):
+        """
+        Scan the file once, recording the column names, the byte offset of the first row of
+        every chunk and the total number of rows.
+        """
+        offsets = []
+        length = 0
+        with open(self.path, 'rb') as file:
+            header = file.readline()
+            position = len(header)
+            for line in file:
+                if line.strip():
+                    if length % self.chunk_size == 0:
+                        offsets.append(position)
+                    length += 1
+                position += len(line)
+        columns = header.decode().strip().split(',')
+        return columns, offsets, length
+
+    def _read_chunk(self, index):
+        with open(self.path, 'rb') as file:
+            file.seek(self._offsets[index])
+            df = pd.read_csv(file, header=None, names=self._columns, nrows=self.chunk_size)
+        return ColumnarMarketData.from_dataframe(df)
+
+    def _chunk(self, index):
+        chunk = self._chunks.get(index)
+        if chunk is not None:
+            self._chunks.move_to_end(index)
+            return chunk
+        chunk = self._read_chunk(index)
+        self._chunks[index] = chunk
+        if len(self._chunks) > self.max_chunks:
+            self._chunks.popitem(last=False)
+        return chunk
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def iter_chunks(self):
+        """
+        Yield every chunk in order as ColumnarMarketData, without keeping them cached.
+        """
+        for index in range(len(self._offsets)):
+            yield self._read_chunk(index)
+
+    def row(self, step):
+        """
+        Return a read-only view of the market observation at a step, loading its chunk if needed.
+
+        :param step: Index of the row.
+        """
+        if step < 0:
+            step += self._length
+        if not 0 <= step < self._length:
+            raise IndexError(f'Step {step} is out of bounds for market data of length {self._length}')
+        return self._chunk(step // self.chunk_size).row(step % self.chunk_size)
+
+    def price(self, step):
+        """
+        Return the market price at a step.
+
+        :param step: Index of the row.
+        """
+        return self._chunk(step // self.chunk_size).price(step % self.chunk_size)
+
+    def prices(self, start=0, stop=None):
+        """
+        Return the market prices of a range of steps, reading the chunks that cover it.
+
+        :param start: First step of the range.
+        :param stop: Step after the last one of the range; defaults to the end of the data.
+        """
+        stop = self._length if stop is None else min(stop, self._length)
+        if start >= stop:
+            return np.empty(0)
+        first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+        # Copy each slice so only the prices, not the whole parsed chunks, stay in memory
+        parts = [self._read_chunk(index).prices().copy() for index in range(first, last + 1)]
+        offset = first * self.chunk_size
+        return np.concatenate(parts)[start - offset:stop - offset]
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Return the hex SHA-256 digest of a file's contents, or of the files of a directory of binary
+    columns (see ColumnarMarketData.from_directory) taken in column order.
+
+    :param path: Path to the file or directory.
+    :param chunk_size: Number of bytes hashed per read.
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'columns.json')) as file:
+            count = len(json.load(file))
+        paths = [os.path.join(path, 'columns.json')] + [os.path.join(path, f'{i}.npy') for i in range(count)]
+    else:
+        paths = [path]
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_cached(path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load a market data CSV through the binary cache, converting it on first use.
+
+    The cache entry is a directory named after the CSV's content hash holding one ``.npy`` file
+    per column and a ``columns.json`` manifest. Entries are written to a temporary directory and
+    renamed into place, so concurrent loaders never see a partially written entry.
+
+    :param path: Path to the CSV file containing market data.
+    :param cache_dir: Directory holding the cache entries.
+    :return: ColumnarMarketData whose columns are read-only memory maps.
+    """
+    entry = os.path.join(cache_dir, file_digest(path))
+    manifest = os.path.join(entry, 'columns.json')
+    if not os.path.exists(manifest):
+        os.makedirs(cache_dir, exist_ok=True)
+        market_data = ColumnarMarketData.from_csv(path)
+        staging = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            for i, name in enumerate(market_data.columns):
+                np.save(os.path.join(staging, f'{i}.npy'), market_data.column(name))
+            with open(os.path.join(staging, 'columns.json'), 'w') as file:
+                json.dump(market_data.columns, file)
+            os.rename(staging, entry)
+        except OSError:
+            # Another process finished the same entry first
+            if not os.path.exists(manifest):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    return ColumnarMarketData.from_directory(entry)
+
+
+def open_market_data(data, backend='pandas', cache_dir=DEFAULT_CACHE_DIR, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Load market data with the requested backend.
+
+    :param data: Path to a market data CSV, or an already loaded DataFrame or market data source.
+                 A path to a directory of binary columns (see ColumnarMarketData.from_directory)
+                 is memory-mapped with any backend.
+    :param backend: 'pandas' for a DataFrame, 'columnar' for contiguous NumPy arrays, 'cached'
+                    for NumPy arrays memory-mapped from the binary cache, or 'chunked' to stream
+                    the CSV in bounded memory.
+    :param cache_dir: Directory of the binary cache used by the 'cached' backend.
+    :param chunk_size: Number of rows per chunk used by the 'chunked' backend.
+    :return: The loaded market data.
+    """
+    if not isinstance(data, str):
+        return data
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown market data backend {backend!r}, expected one of {BACKENDS}')
+    if os.path.isdir(data):
+        return ColumnarMarketData.from_directory(data)
+    if backend == 'pandas':
+        return pd.read_csv(data)
+    if backend == 'columnar':
+        return ColumnarMarketData.from_csv(data)
+    if backend == 'cached':
+        return load_cached(data, cache_dir)
+    if backend == 'chunked':
+        return ChunkedMarketData(data, chunk_size)
+    raise ValueError(f'Unknown market data backend {backend!r}, expected one of {BACKENDS}')
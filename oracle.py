@@ -0,0 +1,108 @@
+"""
+Optimal-profit oracle for benchmarking policies.
+
+Given the market prices and the Battery constraints, the oracle computes the maximum profit any
+policy could make from a start step to the end of the data, which is where every evaluation
+episode ends. It runs a backward dynamic program over a discretized state of charge: each step
+is a vectorized O(grid size) update over the SoC grid. A single backward pass yields the
+optimal value of every start step at once, so all trials of an evaluation share one pass.
+
+Profit follows BatteryEnv.process_action: moving the state of charge by delta kWh earns
+``-delta * (duration / 60) * price`` whether charging or discharging, while efficiency limits
+how far the state of charge can move in one step. Overfilling or overdraining the battery never
+adds profit, so the optimal schedule never does it and the grid covers exactly [0, capacity].
+Restricting the state of charge to the grid makes the result a slight underestimate of the true
+optimum; a finer resolution tightens it at the cost of speed.
+"""
+
+import numpy as np
+
+
+class OptimalProfitOracle:
+    def __init__(self, prices, capacity=100, charge_rate=50, discharge_rate=50, efficiency=0.9,
+                 duration=5, resolution=0.25):
+        """
+        :param prices: Array of market prices for every step of the market data.
+        :param capacity: Maximum capacity of the battery in kWh.
+        :param charge_rate: Maximum charging rate of the battery in kW.
+        :param discharge_rate: Maximum discharging rate of the battery in kW.
+        :param efficiency: Charging and discharging efficiency of the battery.
+        :param duration: Duration of each step in minutes.
+        :param resolution: Spacing of the state of charge grid in kWh.
+        """
+        self.prices = np.asarray(prices, dtype=float)
+        self.duration = duration
+        num_levels = int(round(capacity / resolution)) + 1
+        self.soc_grid = np.linspace(0, capacity, num_levels)
+        self._levels = np.arange(num_levels)
+        step = self.soc_grid[1] - self.soc_grid[0] if num_levels > 1 else capacity
+        # Small tolerance so moves that land exactly on a grid point are not lost to rounding
+        self._max_up = int(np.floor(charge_rate * (duration / 60) * efficiency / step + 1e-9))
+        self._max_down = int(np.floor(discharge_rate * (duration / 60) / efficiency / step + 1e-9))
+
+        # Values at the last step: no further action can be taken
+        self._step = len(self.prices) - 1
+        self._values = np.zeros(num_levels)
+        self._cache = {self._step: self._values}
+
+    def _backward(self, values, price):
+        """
+        One step of the dynamic program: the best value of every grid level given the values
+        of the next step.
+        """
+        scale = (self.duration / 60) * price
+        # Profit of moving from level i to level j is (soc_i - soc_j) * scale. The values are
+        # concave in the state of charge, so the best reachable level is the overall best level
+        # clipped to the range reachable from level i in one step.
+        candidates = values - self.soc_grid * scale
+        best = np.argmax(candidates)
+        reachable = np.clip(best, self._levels - self._max_down, self._levels + self._max_up)
+        return candidates[reachable] + self.soc_grid * scale
+
+    def values_at(self, start_step):
+        """
+        Return the optimal value of every grid level at a step, extending the backward pass if needed.
+
+        :param start_step: Step at which the episode starts.
+        :return: Array of optimal profits, one per level of soc_grid.
+        """
+        start_step = min(max(start_step, 0), len(self.prices) - 1)
+        if start_step in self._cache:
+            return self._cache[start_step]
+        if start_step > self._step:
+            # Earlier requests already took the pass further back; start again from the end
+            self._step = len(self.prices) - 1
+            self._values = np.zeros(len(self.soc_grid))
+        while self._step > start_step:
+            self._step -= 1
+            self._values = self._backward(self._values, self.prices[self._step])
+        self._cache[start_step] = self._values
+        return self._values
+
+    def optimal_profits(self, start_steps, initial_socs):
+        """
+        Return the optimal profit from each start step and initial state of charge to the end of the data.
+
+        :param start_steps: Starting step of each episode.
+        :param initial_socs: Initial state of charge of each episode, scalar or one per episode.
+        :return: Array of optimal profits, one per episode.
+        """
+        start_steps = np.atleast_1d(np.asarray(start_steps, dtype=np.int64))
+        initial_socs = np.broadcast_to(np.asarray(initial_socs, dtype=float), start_steps.shape)
+        profits = np.empty(len(start_steps))
+        # Visit start steps from the latest so one backward pass serves them all
+        for i in np.argsort(-start_steps, kind='stable'):
+            profits[i] = np.interp(initial_socs[i], self.soc_grid, self.values_at(int(start_steps[i])))
+        return profits
+
+
+def oracle_for_env(env, resolution=0.25):
+    """
+    Build an oracle for the market data and battery of a BatteryEnv.
+
+    :param env: BatteryEnv whose market data and battery parameters are used.
+    :param resolution: Spacing of the state of charge grid in kWh.
+    """
+    battery = env.battery
+    return OptimalProfitOracle(env.market_prices(), battery.capacity, battery.charge_rate,
+                               battery.discharge_rate, battery.efficiency, resolution=resolution)
@@ -1,49 +1,155 @@
-import matplotlib.pyplot as plt
+"""
+Plots of simulation results.
 
-def plot_results(actions, profits, socs, market_prices, save_path=None):
+Long episodes are downsampled to the figure's pixel budget before drawing: each series is split
+into one bucket per horizontal pixel and only the first, minimum, maximum and last point of every
+bucket are kept, so spikes and troughs survive while a year of 5-minute data draws as quickly as
+a day. Saved figures are rendered headless with the Agg canvas of the matplotlib Figure API, which
+needs no display and no pyplot global state, and plot_runs renders the trial CSVs of many result
+directories in parallel.
+
+Example:
+    python plotting.py 'results/*/runs/*.csv' --workers 8
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+FIGSIZE = (7, 7)
+DPI = 100
+DEFAULT_PATTERN = os.path.join('results', '*', 'runs', '*.csv')
+# Column of the trial CSVs written by evaluate.py for each series of plot_results
+RUN_COLUMNS = {'actions': 'Actions', 'profits': 'Profits', 'socs': 'SoC', 'market_prices': 'Market Prices'}
+
+
+def minmax_indices(values, buckets):
     """
-    Plot the results of the simulation including actions, market prices, battery state of charge, and cumulative profits.
+    Return the sorted indices of the first, minimum, maximum and last value of each of a number of
+    equally sized buckets. Plotting only these points draws the same envelope as the full series
+    at one bucket per pixel.
+
+    :param values: One-dimensional array; it is not copied.
+    :param buckets: Number of buckets, normally the plot width in pixels.
+    """
+    n = len(values)
+    if n <= 4 * buckets:
+        return np.arange(n)
+    size = n // buckets
+    body = values[:size * buckets].reshape(buckets, size)  # A view, the tail is handled separately
+    starts = np.arange(buckets) * size
+    indices = np.concatenate((starts, starts + size - 1,
+                              starts + np.argmin(body, axis=1), starts + np.argmax(body, axis=1)))
+    tail = np.arange(size * buckets, n)
+    if len(tail):
+        tail_values = values[size * buckets:]
+        indices = np.concatenate((indices, tail[[0, np.argmin(tail_values), np.argmax(tail_values), -1]]))
+    return np.unique(indices)
 
-    :param actions: List of actions taken at each step.
-    :param profits: List of total profits at each step.
-    :param socs: List of battery state of charge at each step.
-    :param market_prices: List of market prices at each step.
-    """
-    # Number of steps in the simulation
-    steps = list(range(1, len(actions) + 1))
-
-    # Setting up the plot
-    plt.figure(figsize=(7, 7))
-
-    # Plotting Actions
-    plt.subplot(4, 1, 1)
-    plt.plot(steps, actions, label='Actions', color='blue')
-    plt.ylabel('Action (kW)')
-    plt.title('Battery Actions Over Time')
-
-    # Plotting Market Prices
-    plt.subplot(4, 1, 2)
-    plt.plot(steps, market_prices, label='Market Price', color='green')
-    plt.ylabel('Market Price ($/kWh)')
-    plt.title('Market Price Over Time')
-
-    # Plotting Total Profit
-    plt.subplot(4, 1, 3)
-    plt.plot(steps, profits, label='Total Profit', color='red')
-    plt.axhline(y=0, color='r', linestyle='--')
-    plt.ylabel('Total Profit ($)')
-    plt.title('Total Profit Over Time')
-
-    # Plotting Battery State of Charge
-    plt.subplot(4, 1, 4)
-    plt.plot(steps, socs, label='Battery SoC', color='purple')
-    plt.xlabel('Time Step')
-    plt.ylabel('State of Charge (kWh)')
-    plt.title('Battery State of Charge Over Time')
-
-    plt.tight_layout()
 
+def _draw(figure, actions, profits, socs, market_prices, max_points):
+    actions, profits, socs, market_prices = (np.asarray(values) for values in (actions, profits, socs, market_prices))
+    buckets = max(int(max_points) // 4, 1) if max_points else int(FIGSIZE[0] * figure.dpi)
+    panels = (
+        (actions, 'Actions', 'blue', 'Action (kW)', 'Battery Actions Over Time'),
+        (market_prices, 'Market Price', 'green', 'Market Price ($/kWh)', 'Market Price Over Time'),
+        (profits, 'Total Profit', 'red', 'Total Profit ($)', 'Total Profit Over Time'),
+        (socs, 'Battery SoC', 'purple', 'State of Charge (kWh)', 'Battery State of Charge Over Time'),
+    )
+    for position, (values, label, color, ylabel, title) in enumerate(panels, start=1):
+        axes = figure.add_subplot(4, 1, position)
+        indices = minmax_indices(values, buckets)
+        # Steps are numbered from 1
+        axes.plot(indices + 1, values[indices], label=label, color=color)
+        if label == 'Total Profit':
+            axes.axhline(y=0, color='r', linestyle='--')
+        if position == len(panels):
+            axes.set_xlabel('Time Step')
+        axes.set_ylabel(ylabel)
+        axes.set_title(title)
+    figure.tight_layout()
+
+
+def plot_results(actions, profits, socs, market_prices, save_path=None, max_points=None):
+    """
+    Plot the results of the simulation including actions, market prices, battery state of charge, and cumulative profits.
+
+    :param actions: Actions taken at each step, as a list or array.
+    :param profits: Total profits at each step.
+    :param socs: Battery state of charge at each step.
+    :param market_prices: Market prices at each step.
+    :param save_path: Image file to render to without a display; shows an interactive window if not given.
+    :param max_points: Maximum number of points drawn per series; defaults to four per pixel of width.
+    """
     if save_path:
-        plt.savefig(save_path)
-    else:
-        plt.show()
\ No newline at end of file
+        figure = Figure(figsize=FIGSIZE, dpi=DPI)
+        FigureCanvasAgg(figure)
+        _draw(figure, actions, profits, socs, market_prices, max_points)
+        figure.savefig(save_path)
+        return
+
+    import matplotlib.pyplot as plt
+    figure = plt.figure(figsize=FIGSIZE)
+    _draw(figure, actions, profits, socs, market_prices, max_points)
+    plt.show()
+
+
+def plot_run(csv_path, save_path=None, max_points=None):
+    """
+    Render the plot of a trial CSV written by evaluate.py, by default next to it as a PNG.
+
+    :return: Path of the image written.
+    """
+    save_path = save_path or os.path.splitext(csv_path)[0] + '.png'
+    run = pd.read_csv(csv_path, usecols=list(RUN_COLUMNS.values()))
+    plot_results(**{name: run[column].to_numpy() for name, column in RUN_COLUMNS.items()},
+                 save_path=save_path, max_points=max_points)
+    return save_path
+
+
+def _plot_run_task(task):
+    return plot_run(*task)
+
+
+def plot_runs(pattern=DEFAULT_PATTERN, workers=os.cpu_count(), max_points=None, overwrite=False):
+    """
+    Render every trial CSV matching a glob pattern in parallel worker processes.
+
+    :param pattern: Glob pattern of the trial CSVs.
+    :param workers: Number of worker processes.
+    :param max_points: Maximum number of points drawn per series.
+    :param overwrite: Also render trials that already have an up-to-date image.
+    :return: Paths of the images written.
+    """
+    tasks = []
+    for csv_path in sorted(glob.glob(pattern)):
+        save_path = os.path.splitext(csv_path)[0] + '.png'
+        if overwrite or not os.path.exists(save_path) or os.path.getmtime(save_path) < os.path.getmtime(csv_path):
+            tasks.append((csv_path, save_path, max_points))
+    if workers <= 1 or len(tasks) <= 1:
+        return [_plot_run_task(task) for task in tasks]
+    with multiprocessing.Pool(workers) as pool:
+        return pool.map(_plot_run_task, tasks, chunksize=max(len(tasks) // (4 * workers), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render plots of trial results.')
+    parser.add_argument('patterns', nargs='*', default=[DEFAULT_PATTERN], help='Glob patterns of trial CSVs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--max_points', type=int, help='Maximum number of points drawn per series')
+    parser.add_argument('--overwrite', action='store_true', help='Re-render trials that already have an image')
+    args = parser.parse_args()
+
+    written = []
+    for pattern in args.patterns:
+        written.extend(plot_runs(pattern, args.workers, args.max_points, args.overwrite))
+    print(f'Rendered {len(written)} plots')
+
+
+if __name__ == '__main__':
+    main()
@@ -5,26 +5,152 @@ This script is crucial for dynamically loading and registering policy classes fr
 Python files in this directory. It is an integral part of the evaluation process for submissions.
 Any modifications to this file may disrupt the evaluation system and are strongly discouraged.
 
-The script automatically imports all policy classes defined in separate files within
-the same directory, making them available for use in evaluations.
+The script automatically finds all policy classes defined in separate files within
+the same directory, making them available for use in evaluations. Policy classes are found
+by statically scanning the source of each file, and a file is only imported when one of its
+classes is looked up in policy_classes, so evaluating one policy does not pay for importing
+every other policy and its dependencies. Scan results are cached by file modification time.
 """
 
-import os
+import ast
 import importlib
+import json
+import os
+from collections.abc import Mapping
 from policies.policy import Policy
 
-# Dictionary to hold the class names and references of the dynamically imported policies
-policy_classes = {}
+_POLICY_DIR = os.path.dirname(__file__)
+_CACHE_PATH = os.path.join(_POLICY_DIR, '__pycache__', 'policy_registry.json')
 
 # Gather all .py files in the current directory, excluding '__init__.py'
-policy_files = [f[:-3] for f in os.listdir(os.path.dirname(__file__))
+policy_files = [f[:-3] for f in os.listdir(_POLICY_DIR)
                 if f.endswith('.py') and f != '__init__.py']
 
-# Dynamically import each policy file and extract policy classes
-for file in policy_files:
-    module = importlib.import_module('.' + file, package='policies')
-    for attr in dir(module):
-        attr_value = getattr(module, attr)
-        # Check if the attribute is a class and is a subclass of Policy
-        if isinstance(attr_value, type) and issubclass(attr_value, Policy) and attr != 'Policy':
-            policy_classes[attr] = attr_value
+
+def _scan_classes(path):
+    """
+    Return the classes defined at the top level of a file, mapped to the names of their bases.
+    """
+    with open(path, 'rb') as file:
+        tree = ast.parse(file.read(), filename=path)
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            bases = []
+            for base in node.bases:
+                if isinstance(base, ast.Name):
+                    bases.append(base.id)
+                elif isinstance(base, ast.Attribute):
+                    bases.append(base.attr)
+            classes[node.name] = bases
+    return classes
+
+
+def _load_scan_cache():
+    try:
+        with open(_CACHE_PATH) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_scan_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(_CACHE_PATH), exist_ok=True)
+        with open(_CACHE_PATH, 'w') as file:
+            json.dump(cache, file)
+    except OSError:
+        pass  # The cache is only an optimisation, e.g. for read-only checkouts
+
+
+class LazyPolicyRegistry(Mapping):
+    def __init__(self, module_names):
+        """
+        Mapping of policy class names to classes that imports each module on first lookup.
+
+        :param module_names: Names of the modules in this package to scan for policy classes.
+        """
+        self._module_names = module_names
+        self._locations = self._scan(module_names)
+        self._classes = {}
+        self._imported_all = False
+
+    @staticmethod
+    def _scan(module_names):
+        cache = _load_scan_cache()
+        scanned = {}
+        for name in module_names:
+            path = os.path.join(_POLICY_DIR, name + '.py')
+            mtime = os.path.getmtime(path)
+            entry = cache.get(name)
+            if entry is None or entry['mtime'] != mtime:
+                try:
+                    entry = {'mtime': mtime, 'classes': _scan_classes(path)}
+                except SyntaxError:
+                    # Left for the import to report when the class is looked up
+                    entry = {'mtime': mtime, 'classes': {}}
+            scanned[name] = entry
+        if scanned != cache:
+            _save_scan_cache(scanned)
+
+        # A class is a policy if it derives from Policy or, transitively, from another policy class
+        bases = {cls: (module, entry_bases) for module, entry in scanned.items()
+                 for cls, entry_bases in entry['classes'].items()}
+        policies = {'Policy'}
+        changed = True
+        while changed:
+            changed = False
+            for cls, (_, cls_bases) in bases.items():
+                if cls not in policies and policies.intersection(cls_bases):
+                    policies.add(cls)
+                    changed = True
+        return {cls: bases[cls][0] for cls in policies if cls != 'Policy' and cls in bases}
+
+    @staticmethod
+    def _policy_classes_of(module):
+        for attr in dir(module):
+            attr_value = getattr(module, attr)
+            # Check if the attribute is a class and is a subclass of Policy
+            if isinstance(attr_value, type) and issubclass(attr_value, Policy) and attr != 'Policy':
+                yield attr, attr_value
+
+    def _import_all(self):
+        # Fallback for classes the static scan cannot see, e.g. ones created dynamically
+        for file in self._module_names:
+            module = importlib.import_module('.' + file, package='policies')
+            for attr, attr_value in self._policy_classes_of(module):
+                self._classes.setdefault(attr, attr_value)
+                self._locations.setdefault(attr, file)
+        self._imported_all = True
+
+    def __getitem__(self, name):
+        if name in self._classes:
+            return self._classes[name]
+        module_name = self._locations.get(name)
+        if module_name is not None:
+            module = importlib.import_module('.' + module_name, package='policies')
+            policy_class = getattr(module, name, None)
+            if isinstance(policy_class, type) and issubclass(policy_class, Policy):
+                self._classes[name] = policy_class
+                return policy_class
+        if not self._imported_all:
+            self._import_all()
+            if name in self._classes:
+                return self._classes[name]
+        raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self._locations or name in self._classes
+
+    def __iter__(self):
+        return iter(list(self._locations))
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __repr__(self):
+        return f'LazyPolicyRegistry({sorted(self._locations)!r})'
+
+
+# Mapping of the class names to the lazily imported policy classes
+policy_classes = LazyPolicyRegistry(policy_files)
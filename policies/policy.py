@@ -35,6 +35,9 @@ class Policy(ABC):
             - 'remaining_steps' (int): Number of steps remaining in the simulation.
             - 'max_charge_rate' (float, kW): Maximum rate at which the battery can be charged.
             - 'max_discharge_rate' (float, kW): Maximum rate at which the battery can be discharged.
+            - 'features' (mapping, optional): Precomputed features of the current step, such as rolling
+              price means and volatility, lagged prices and time-of-day buckets, when the evaluation
+              attaches a FeatureStore (evaluate.py --features).
 
         Your policy should use these inputs to decide on an action to take, which could be charging, 
         discharging, or doing nothing. The action is represented as a float:
@@ -52,3 +55,14 @@ class Policy(ABC):
 # - Implement your policy by extending the Policy class.
 # - Use the 'act' method to make decisions based on market conditions and battery information.
 # - Your policy will be evaluated on market data from late April to early May 2024.
+# - Optionally, define 'act_batch(market_observations, infos)' to decide for many episodes at once
+#   in the vectorized environment (vector_env.py). Observations and infos are dictionaries of arrays
+#   with one entry per episode, and infos['done'] marks finished episodes. See RollingAveragePolicy.
+# - Policies that decide from market prices alone may also define 'act_vectorized(prices, battery_params)',
+#   returning one action per price for a whole episode. With evaluate.py --replay the episode is then
+#   simulated in one pass instead of calling 'act' every step. The policy receives no per-step 'info'
+#   on this path, and must only use the price of each step and earlier ones when deciding that step.
+#   Submissions are always evaluated with 'act'.
+# - Observations and infos support observation['key'], .get('key') and iteration like dictionaries,
+#   but are read-only. With evaluate.py --reuse_views the same objects are updated in place every step,
+#   so copy any values you want to keep (e.g. dict(info)) rather than storing the objects themselves.
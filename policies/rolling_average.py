@@ -9,7 +9,7 @@ own policy implementations.
 """
 
 from policies.policy import Policy
-from collections import deque
+from policies.rolling_stats import BatchRollingMean, RollingMean
 import numpy as np
 
 class RollingAveragePolicy(Policy):
@@ -22,7 +22,21 @@ class RollingAveragePolicy(Policy):
         """
         super().__init__()
         self.window_size = window_size
-        self.past_prices = deque(maxlen=self.window_size)
+        self.rolling_mean = RollingMean(self.window_size)
+        self.batch_rolling_mean = None
+
+    def _rolling_average(self, price):
+        """
+        Add a price to the window and return the rolling average to compare it with.
+
+        The running mean is exact, while np.mean over the window, which this policy has always
+        used, rounds. When the price is within rounding distance of the mean, as on flat or
+        rounded prices, the comparison is settled with np.mean so the decisions never change.
+        """
+        rolling_average = self.rolling_mean.update(price)
+        if abs(price - rolling_average) <= self.rolling_mean.rounding_bound:
+            rolling_average = np.mean(self.rolling_mean.values)
+        return rolling_average
 
     def act(self, market_observation, info):
         """
@@ -36,12 +50,69 @@ class RollingAveragePolicy(Policy):
         :return: The action to be taken, represented as a float.
         """
         current_price = market_observation.get('Market_Price')
-        self.past_prices.append(current_price)
-
-        rolling_average = np.mean(self.past_prices)
+        rolling_average = self._rolling_average(current_price)
 
         # Decide action based on the comparison with the rolling average
         if current_price > rolling_average:
             return -info.get('max_discharge_rate')  # Discharge at maximum rate
         else:
             return info.get('max_charge_rate')  # Charge at maximum rate
+
+    def act_vectorized(self, prices, battery_params):
+        """
+        Decide on the actions for a whole episode at once, continuing from the prices already
+        seen by act, and leave the rolling window as if act had been called on every price.
+
+        Window means come from cumulative sums. Where a price is within the rounding error of
+        those sums and of np.mean of its mean, the comparison is settled with np.mean of the
+        window, the same value act compares against, so the actions equal those of act.
+
+        :param prices: Array of market prices from the first step of the episode to the end of the data.
+        :param battery_params: Dictionary of battery parameters, including 'charge_rate' and 'discharge_rate'.
+        :return: Array of actions, one per price.
+        """
+        prices = np.asarray(prices, dtype=float)
+        seen = len(self.rolling_mean.values)
+        history = np.concatenate((np.array(self.rolling_mean.values, dtype=float), prices))
+        sums = np.concatenate(([0.0], np.cumsum(history)))
+        abs_sums = np.concatenate(([0.0], np.cumsum(np.abs(history))))
+        ends = np.arange(seen + 1, len(history) + 1)
+        starts = np.maximum(ends - self.window_size, 0)
+        counts = ends - starts
+        rolling_average = (sums[ends] - sums[starts]) / counts
+
+        # A prefix sum of k values is within k roundings of the sum of their magnitudes, and np.mean
+        # within count roundings of the window's magnitudes; twice both covers the remaining roundings
+        eps = np.finfo(float).eps
+        window_abs_mean = (abs_sums[ends] - abs_sums[starts]) / counts
+        bound = 2 * (2 * ends * eps * abs_sums[ends] / counts + counts * eps * window_abs_mean
+                     + 4 * np.spacing(np.abs(rolling_average)))
+        discharging = prices > rolling_average
+        for i in np.flatnonzero(np.abs(prices - rolling_average) <= bound).tolist():
+            discharging[i] = prices[i] > np.mean(np.array(history[starts[i]:ends[i]]))
+
+        self.rolling_mean = RollingMean(self.window_size)
+        for price in history[-self.window_size:].tolist():
+            self.rolling_mean.update(price)
+
+        return np.where(discharging, -battery_params['discharge_rate'], battery_params['charge_rate'])
+
+    def act_batch(self, market_observations, infos):
+        """
+        Batched version of act for the vectorized environment, keeping one price window per episode.
+
+        :param market_observations: Dictionary mapping market data columns to arrays, one entry per episode.
+        :param infos: Dictionary mapping info keys to arrays, including a 'done' mask of finished episodes.
+        :return: Array of actions, one per episode.
+        """
+        current_prices = market_observations['Market_Price']
+        if self.batch_rolling_mean is None or len(self.batch_rolling_mean.counts) != len(current_prices):
+            self.batch_rolling_mean = BatchRollingMean(len(current_prices), self.window_size)
+        running = np.flatnonzero(~infos['done'])
+        rolling_average = self.batch_rolling_mean.update(current_prices, rows=running)
+        # Settle near ties with np.mean of the window, as act does
+        bound = self.batch_rolling_mean.rounding_bound
+        for row in running[np.abs(current_prices[running] - rolling_average[running]) <= bound[running]].tolist():
+            rolling_average[row] = np.mean(self.batch_rolling_mean.window(row))
+
+        return np.where(current_prices > rolling_average, -infos['max_discharge_rate'], infos['max_charge_rate'])
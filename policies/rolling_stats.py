@@ -0,0 +1,271 @@
+"""
+Incremental rolling statistics for policies.
+
+Each statistic is updated in O(1) (amortized) work per observation, independent of the window
+size, so policies can track multi-day windows without recomputing over the whole window on
+every step. The module defines no Policy subclasses and is only a helper for policies.
+"""
+
+from collections import deque
+import math
+import sys
+import numpy as np
+
+
+def _add_exact(partials, value):
+    """
+    Add a value to a list of non-overlapping partial sums whose total is the exact sum of all
+    values added so far (Shewchuk's algorithm, as used by math.fsum).
+    """
+    i = 0
+    for partial in partials:
+        if abs(value) < abs(partial):
+            value, partial = partial, value
+        high = value + partial
+        low = partial - (high - value)
+        if low:
+            partials[i] = low
+            i += 1
+        value = high
+    partials[i:] = [value]
+
+
+class RollingMean:
+    def __init__(self, window_size):
+        """
+        Mean of the last window_size values. The running sum is kept exactly, so the mean does
+        not drift no matter how many values pass through the window.
+
+        :param window_size: Number of most recent values included in the mean.
+        """
+        self.window_size = window_size
+        self.values = deque()
+        self._partials = []
+        self._abs_sum = 0.0
+
+    def update(self, value):
+        """
+        Add a value, dropping the oldest one once the window is full.
+
+        :param value: The new observation.
+        :return: The updated mean.
+        """
+        value = float(value)
+        self.values.append(value)
+        _add_exact(self._partials, value)
+        self._abs_sum += abs(value)
+        if len(self.values) > self.window_size:
+            old = self.values.popleft()
+            _add_exact(self._partials, -old)
+            self._abs_sum -= abs(old)
+        return self.mean
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    @property
+    def mean(self):
+        return math.fsum(self._partials) / len(self.values) if self.values else math.nan
+
+    @property
+    def rounding_bound(self):
+        """
+        Upper bound on the difference between mean and the mean of the window computed in
+        floating point, e.g. by np.mean: a sum of n values is off by at most n - 1 roundings of
+        the sum of their magnitudes, plus one rounding of each division.
+        """
+        count = len(self.values)
+        if not count:
+            return math.nan
+        mean = abs(self.mean)
+        return count * sys.float_info.epsilon * max(self._abs_sum / count, mean) + 2 * math.ulp(mean)
+
+
+class RollingVariance:
+    def __init__(self, window_size):
+        """
+        Population variance of the last window_size values, using Welford's update extended to
+        remove the value leaving the window.
+
+        :param window_size: Number of most recent values included in the variance.
+        """
+        self.window_size = window_size
+        self.values = deque()
+        self.mean = math.nan
+        self._m2 = 0.0
+
+    def update(self, value):
+        """
+        Add a value, dropping the oldest one once the window is full.
+
+        :param value: The new observation.
+        :return: The updated variance.
+        """
+        value = float(value)
+        if not self.values:
+            self.mean = 0.0
+        self.values.append(value)
+        delta = value - self.mean
+        self.mean += delta / len(self.values)
+        self._m2 += delta * (value - self.mean)
+        if len(self.values) > self.window_size:
+            old = self.values.popleft()
+            delta = old - self.mean
+            self.mean -= delta / len(self.values)
+            self._m2 -= delta * (old - self.mean)
+        return self.variance
+
+    @property
+    def count(self):
+        return len(self.values)
+
+    @property
+    def variance(self):
+        return max(self._m2, 0.0) / len(self.values) if self.values else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class EWMA:
+    def __init__(self, alpha=None, span=None):
+        """
+        Exponentially weighted moving average, initialised with the first value.
+
+        :param alpha: Smoothing factor in (0, 1]; weight of the newest value.
+        :param span: Alternative to alpha, equivalent to alpha = 2 / (span + 1).
+        """
+        if (alpha is None) == (span is None):
+            raise ValueError('Specify exactly one of alpha or span')
+        self.alpha = alpha if alpha is not None else 2 / (span + 1)
+        self.mean = math.nan
+        self.count = 0
+
+    def update(self, value):
+        """
+        Add a value.
+
+        :param value: The new observation.
+        :return: The updated average.
+        """
+        value = float(value)
+        self.mean = value if self.count == 0 else self.alpha * value + (1 - self.alpha) * self.mean
+        self.count += 1
+        return self.mean
+
+
+class RollingMax:
+    def __init__(self, window_size):
+        """
+        Maximum of the last window_size values, using a monotonic deque of candidates.
+
+        :param window_size: Number of most recent values considered.
+        """
+        self.window_size = window_size
+        self.count = 0
+        self._candidates = deque()
+
+    def _dominates(self, new, old):
+        return new >= old
+
+    def update(self, value):
+        """
+        Add a value, dropping the oldest one once the window is full.
+
+        :param value: The new observation.
+        :return: The updated extreme value.
+        """
+        value = float(value)
+        candidates = self._candidates
+        while candidates and self._dominates(value, candidates[-1][1]):
+            candidates.pop()
+        candidates.append((self.count, value))
+        self.count += 1
+        if candidates[0][0] <= self.count - 1 - self.window_size:
+            candidates.popleft()
+        return candidates[0][1]
+
+    @property
+    def value(self):
+        return self._candidates[0][1] if self._candidates else math.nan
+
+
+class RollingMin(RollingMax):
+    """
+    Minimum of the last window_size values, using a monotonic deque of candidates.
+    """
+
+    def _dominates(self, new, old):
+        return new <= old
+
+
+class BatchRollingMean:
+    def __init__(self, num_series, window_size):
+        """
+        Rolling means of many independent series updated together, one value per series per
+        update. Sums use Neumaier compensation so they stay accurate over long episodes.
+
+        :param num_series: Number of independent series.
+        :param window_size: Number of most recent values included in each mean.
+        """
+        self.window_size = window_size
+        self.values = np.zeros((num_series, window_size))
+        self.counts = np.zeros(num_series, dtype=np.int64)
+        self._sums = np.zeros(num_series)
+        self._compensation = np.zeros(num_series)
+        self._abs_sums = np.zeros(num_series)
+
+    def _add(self, rows, values):
+        sums = self._sums[rows]
+        totals = sums + values
+        self._compensation[rows] += np.where(np.abs(sums) >= np.abs(values),
+                                             (sums - totals) + values, (values - totals) + sums)
+        self._sums[rows] = totals
+
+    def update(self, values, rows=None):
+        """
+        Add one value to each of the given series.
+
+        :param values: Array of new values, one per series.
+        :param rows: Optional indices of the series to update; defaults to all of them.
+        :return: The rolling mean of every series.
+        """
+        if rows is None:
+            rows = np.arange(len(self.counts))
+        values = np.asarray(values, dtype=float)[rows]
+        slots = self.counts[rows] % self.window_size
+        full = self.counts[rows] >= self.window_size
+        self._add(rows[full], -self.values[rows[full], slots[full]])
+        self._add(rows, values)
+        self._abs_sums[rows[full]] -= np.abs(self.values[rows[full], slots[full]])
+        self._abs_sums[rows] += np.abs(values)
+        self.values[rows, slots] = values
+        self.counts[rows] += 1
+        return self.mean
+
+    @property
+    def mean(self):
+        counts = np.minimum(self.counts, self.window_size)
+        return (self._sums + self._compensation) / np.maximum(counts, 1)
+
+    @property
+    def rounding_bound(self):
+        """
+        Per-series bound on the difference between mean and a floating-point mean of the
+        window, as RollingMean.rounding_bound. The compensated sums are within a few roundings
+        of exact, which the bound for a plain sum covers.
+        """
+        counts = np.maximum(np.minimum(self.counts, self.window_size), 1)
+        mean = np.abs(self.mean)
+        return (counts + 2) * sys.float_info.epsilon * np.maximum(self._abs_sums / counts, mean) + 2 * np.spacing(mean)
+
+    def window(self, row):
+        """
+        Return the values in the window of one series, oldest first.
+        """
+        count = self.counts[row]
+        if count <= self.window_size:
+            return self.values[row, :count]
+        return np.roll(self.values[row], -(count % self.window_size))
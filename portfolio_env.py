@@ -0,0 +1,163 @@
+"""
+Portfolio environment for a fleet of batteries trading on one market.
+
+PortfolioEnv holds the parameters and state of N batteries, each with its own capacity, rates,
+efficiency and initial charge, as NumPy arrays and steps them together against a single
+read-only market feed. The market data is loaded once and shared, so memory grows with the
+number of batteries rather than batteries times dataset size, and each step is a handful of
+array operations over the fleet.
+
+Policies use the same batched interface as the vectorized environment (vector_env.py):
+``act_batch(observations, infos)`` returns one action per battery. Observations are the
+current market row broadcast to the fleet without copying, and infos hold per-battery arrays.
+Scalar policies are wrapped with one copy per battery.
+
+Example:
+    env = PortfolioEnv(capacities=[100, 250, 500], charge_rates=[50, 100, 250], discharge_rates=[50, 100, 250],
+                       initial_charges=[50, 0, 250], backend='cached')
+    result = run_portfolio(env, RollingAveragePolicy())
+"""
+
+import numpy as np
+import pandas as pd
+from battery_kernel import step_batteries
+from market_data import ColumnarMarketData, open_market_data
+from vector_env import batch_policy
+
+
+class PortfolioEnv:
+    def __init__(self, capacities, charge_rates, discharge_rates, initial_charges, efficiencies=0.9,
+                 data='train.csv', backend='columnar'):
+        """
+        Environment for simulating a fleet of batteries over the same market data.
+
+        :param capacities: Maximum capacity of each battery in kWh.
+        :param charge_rates: Maximum charging rate of each battery in kW.
+        :param discharge_rates: Maximum discharging rate of each battery in kW.
+        :param initial_charges: Initial state of charge of each battery in kWh.
+        :param efficiencies: Charging and discharging efficiency of each battery.
+        Each of these is an array with one value per battery or a scalar shared by the fleet.
+        :param data: Path to the CSV file containing market data, or already loaded market data
+                     to share with other environments.
+        :param backend: Market data backend used when data is a path.
+        """
+        params = np.broadcast_arrays(*(np.array(values, dtype=float, ndmin=1) for values in
+                                       (capacities, charge_rates, discharge_rates, initial_charges, efficiencies)))
+        for values in params:
+            values.flags.writeable = False
+        self.capacity, self.charge_rate, self.discharge_rate, self.initial_charge, self.efficiency = params
+        self.num_batteries = len(self.capacity)
+
+        market_data = open_market_data(data, backend)
+        if isinstance(market_data, pd.DataFrame):
+            market_data = ColumnarMarketData.from_dataframe(market_data)
+        self.market_data = market_data
+        self._column_names = market_data.columns
+
+        self.state_of_charge = np.minimum(self.initial_charge, self.capacity)
+        self.total_profit = np.zeros(self.num_batteries)
+        self.current_step = 0
+
+    @classmethod
+    def from_batteries(cls, batteries, data='train.csv', backend='columnar'):
+        """
+        Build a portfolio from Battery instances.
+
+        :param batteries: Sequence of Battery objects, one per site.
+        :param data: Path to the CSV file containing market data, or already loaded market data.
+        :param backend: Market data backend used when data is a path.
+        """
+        return cls([battery.capacity for battery in batteries],
+                   [battery.charge_rate for battery in batteries],
+                   [battery.discharge_rate for battery in batteries],
+                   [battery.initial_charge for battery in batteries],
+                   [battery.efficiency for battery in batteries],
+                   data=data, backend=backend)
+
+    def reset(self, start_step=0, initial_socs=None):
+        """
+        Reset every battery to the same starting step.
+
+        :param start_step: Starting step of the episode.
+        :param initial_socs: Initial state of charge of each battery, or a scalar; defaults to the initial charges.
+        :return: Batched observations and infos, see get_observations and get_info.
+        """
+        self.current_step = start_step
+        self.total_profit = np.zeros(self.num_batteries)
+        if initial_socs is None:
+            initial_socs = self.initial_charge
+        self.state_of_charge = np.minimum(np.broadcast_to(np.asarray(initial_socs, dtype=float), (self.num_batteries,)),
+                                          self.capacity)
+        return self.get_observations(), self.get_info(np.zeros(self.num_batteries))
+
+    def step(self, actions):
+        """
+        Apply one action per battery at the current step.
+
+        :param actions: Array of num_batteries actions in kW; positive charges, negative discharges.
+        :return: Batched observations and infos, or (None, None) at the end of the market data.
+        """
+        if self.current_step >= len(self.market_data) - 1:
+            return None, None
+        market_price = self.market_data.price(self.current_step)
+        self.state_of_charge, profit_delta = step_batteries(
+            self.state_of_charge, np.asarray(actions, dtype=float), market_price, self.capacity,
+            self.charge_rate, self.discharge_rate, self.efficiency)
+        self.current_step += 1
+        return self.get_observations(), self.get_info(profit_delta)
+
+    def get_observations(self):
+        """
+        Return the market data at the current step as a dictionary mapping column names to
+        read-only arrays of length num_batteries that share a single value.
+        """
+        row = self.market_data.row(self.current_step)
+        return {name: np.broadcast_to(row[name], (self.num_batteries,)) for name in self._column_names}
+
+    def get_info(self, profit_delta):
+        self.total_profit = self.total_profit + profit_delta
+        return {
+            'total_profit': self.total_profit,
+            'profit_delta': profit_delta,
+            'battery_soc': self.state_of_charge,
+            'max_charge_rate': self.charge_rate,
+            'max_discharge_rate': self.discharge_rate,
+            'remaining_steps': np.full(self.num_batteries, len(self.market_data) - self.current_step - 1),
+            'done': np.zeros(self.num_batteries, dtype=bool),
+        }
+
+
+def run_portfolio(env, policy, start_step=0, num_steps=None, initial_socs=None, record=False):
+    """
+    Run the fleet from a starting step, recording the fleet-wide profit after every step.
+
+    :param env: PortfolioEnv to run.
+    :param policy: Policy with ``act_batch``, or a scalar policy to be copied for every battery.
+    :param start_step: Starting step of the episode.
+    :param num_steps: Number of steps to run; defaults to the end of the market data.
+    :param initial_socs: Initial state of charge of each battery.
+    :param record: Also record per-battery actions, profits and states of charge, as arrays of
+                   shape (steps, num_batteries).
+    :return: Dictionary with the 'fleet_profit' and 'market_prices' of every step, the final
+             'total_profit' of each battery and, if recording, the per-battery series.
+    """
+    policy = batch_policy(policy, env.num_batteries)
+    max_steps = max(len(env.market_data) - 1 - start_step, 0)
+    num_steps = max_steps if num_steps is None else min(num_steps, max_steps)
+    result = {'fleet_profit': np.empty(num_steps), 'market_prices': np.empty(num_steps)}
+    if record:
+        for name in ('actions', 'profits', 'socs'):
+            result[name] = np.empty((num_steps, env.num_batteries))
+
+    observations, infos = env.reset(start_step, initial_socs)
+    for step in range(num_steps):
+        actions = np.asarray(policy.act_batch(observations, infos), dtype=float)
+        observations, infos = env.step(actions)
+        result['fleet_profit'][step] = infos['total_profit'].sum()
+        result['market_prices'][step] = observations['Market_Price'][0]
+        if record:
+            result['actions'][step] = actions
+            result['profits'][step] = infos['total_profit']
+            result['socs'][step] = infos['battery_soc']
+    result['total_profit'] = env.total_profit.copy()
+    return result
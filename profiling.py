@@ -0,0 +1,153 @@
+"""
+Opt-in per-call latency instrumentation for the battery environment and policies.
+
+A Profiler wraps the bound methods of one environment and policy instance with timers that
+record monotonic nanosecond latencies into preallocated log-bucket histograms, whose size does
+not grow with the number of calls. Nothing in BatteryEnv or the policy changes, so there is no
+overhead at all unless a profiler is attached. Phases nest:
+'env.step' includes the 'process_action' and 'observation' time spent inside it.
+"""
+
+import time
+import numpy as np
+
+# Method name on the instrumented object, and the phase name it is reported under
+ENV_PHASES = {
+    'step': 'env.step',
+    'simulate': 'env.simulate',
+    'process_action': 'process_action',
+    '_observation': 'observation',
+}
+POLICY_PHASES = {
+    'act': 'policy.act',
+    'act_vectorized': 'policy.act_vectorized',
+}
+
+
+class LatencyRecorder:
+    # 2**SUB_BUCKET_BITS linear sub-buckets per power of two, a relative resolution of about 3%
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        """
+        Fixed-size histogram of latencies in nanoseconds with logarithmic buckets, in the style
+        of an HDR histogram. Latencies below 64ns are counted exactly, larger ones in buckets a
+        1/32 of a power of two wide. Memory is a preallocated list whatever the number of calls.
+        """
+        bits = self.SUB_BUCKET_BITS
+        self.counts = [0] * ((64 - bits) << bits)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, nanoseconds):
+        bits = self.SUB_BUCKET_BITS
+        shift = nanoseconds.bit_length() - 1 - bits
+        if shift < 0:
+            self.counts[nanoseconds] += 1
+        else:
+            self.counts[(shift << bits) + (nanoseconds >> shift)] += 1
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+
+    def _bucket_value(self, index):
+        # Midpoint of the bucket: index = (shift << bits) + mantissa, with mantissa in [2**bits, 2**(bits + 1))
+        bits = self.SUB_BUCKET_BITS
+        shift = max((index >> bits) - 1, 0)
+        low = (index - (shift << bits)) << shift
+        return low + ((1 << shift) - 1) / 2
+
+    def percentiles(self, percentiles):
+        """
+        Return the latency in nanoseconds at each of the given percentiles, to bucket resolution.
+        """
+        cumulative = np.cumsum(self.counts)
+        ranks = np.asarray(percentiles, dtype=float) / 100 * (self.count - 1)
+        indices = np.searchsorted(cumulative, ranks, side='right')
+        return np.array([min(self._bucket_value(int(index)), self.max) for index in indices])
+
+
+class Profiler:
+    def __init__(self):
+        """
+        Collects per-phase latency histograms for instrumented environments and policies.
+        """
+        self.recorders = {}
+        self.simulated_steps = 0
+        self._start_ns = None
+        self._stop_ns = None
+
+    def _timed(self, phase, method):
+        recorder = self.recorders.setdefault(phase, LatencyRecorder())
+        record = recorder.record
+        clock = time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                record(clock() - start)
+        return timed
+
+    def _counting_steps(self, simulate):
+        # simulate runs its steps in a batch kernel rather than through process_action
+        def counted(*args, **kwargs):
+            result = simulate(*args, **kwargs)
+            self.simulated_steps += len(result[0])
+            return result
+        return counted
+
+    def instrument(self, env, policy=None):
+        """
+        Wrap the timed methods of an environment and optionally a policy, and start the clock.
+
+        :param env: BatteryEnv instance to instrument.
+        :param policy: Policy instance to instrument.
+        """
+        for target, phases in ((env, ENV_PHASES), (policy, POLICY_PHASES)):
+            if target is None:
+                continue
+            for attr, phase in phases.items():
+                method = getattr(target, attr, None)
+                if method is not None:
+                    if attr == 'simulate':
+                        method = self._counting_steps(method)
+                    setattr(target, attr, self._timed(phase, method))
+        self._start_ns = time.perf_counter_ns()
+        return self
+
+    def stop(self):
+        """
+        Stop the wall clock used for the steps per second figure.
+        """
+        self._stop_ns = time.perf_counter_ns()
+
+    def summary(self):
+        """
+        Return a dictionary with call count, total time and p50/p99/max latency in microseconds
+        for every phase that was called, plus the overall environment steps per second.
+        """
+        phases = {}
+        for phase, recorder in self.recorders.items():
+            if not recorder.count:
+                continue
+            p50, p99 = recorder.percentiles([50, 99]) / 1e3
+            phases[phase] = {
+                'calls': recorder.count,
+                'total_s': recorder.total / 1e9,
+                'p50_us': float(p50),
+                'p99_us': float(p99),
+                'max_us': recorder.max / 1e3,
+            }
+
+        summary = {'phases': phases}
+        if self._start_ns is not None:
+            elapsed = ((self._stop_ns or time.perf_counter_ns()) - self._start_ns) / 1e9
+            # Every step taken through step processes exactly one action
+            steps = phases.get('process_action', {}).get('calls', 0) + self.simulated_steps
+            summary['elapsed_s'] = float(elapsed)
+            summary['steps_per_sec'] = float(steps / elapsed) if elapsed > 0 else 0.0
+        return summary
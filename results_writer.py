@@ -0,0 +1,134 @@
+"""
+Background writer for per-trial evaluation results.
+
+The evaluation loop hands each trial's results to a ResultsWriter, which queues them and writes
+them from a background thread, so the loop never waits on disk. Results are written either as
+one CSV per trial (the original layout of results/<run>/runs/) or as a single consolidated file
+holding all trials with a 'trial_id' column, in NumPy's NPZ format or, if pyarrow is
+installed, as Parquet.
+"""
+
+import importlib.util
+import os
+import queue
+import threading
+import numpy as np
+import pandas as pd
+
+RESULTS_FORMATS = ('csv', 'npz', 'parquet')
+
+_STOP = object()
+
+
+def parquet_available():
+    """
+    Return whether pyarrow, needed by the 'parquet' format, is installed, without importing it.
+    """
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+class ResultsWriter:
+    def __init__(self, runs_dir, results_format='csv', max_queue=0):
+        """
+        :param runs_dir: Directory the results are written to.
+        :param results_format: 'csv' for one file per trial, or 'npz' or 'parquet' for a single
+                               consolidated file named results.npz or results.parquet.
+        :param max_queue: Maximum number of queued trials; 0 means unbounded, so submit never blocks.
+        """
+        if results_format not in RESULTS_FORMATS:
+            raise ValueError(f'Unknown results format {results_format!r}, expected one of {RESULTS_FORMATS}')
+        if results_format == 'parquet':
+            # Fail now rather than in the background thread
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ImportError("The 'parquet' results format requires pyarrow; install it or use 'npz'") from None
+
+        self.runs_dir = runs_dir
+        self.results_format = results_format
+        self._queue = queue.Queue(max_queue)
+        self._error = None
+        self._columns = {}
+        self._parquet_writer = None
+        self._thread = threading.Thread(target=self._run, name='results-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, trial, results):
+        """
+        Queue the results of one trial for writing.
+
+        :param trial: Trial number.
+        :param results: Dictionary mapping column names to equal-length sequences.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put((trial, results))
+
+    def close(self):
+        """
+        Write everything still queued, finish any consolidated file and stop the thread.
+        Re-raises the first error the background thread ran into.
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # Drain whatever is queued so consolidated formats write in batches
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is _STOP:
+                batch.pop()
+                stopping = True
+            if self._error is not None:
+                continue
+            try:
+                if batch:
+                    self._write(batch)
+                if stopping:
+                    self._finish()
+            except Exception as error:
+                self._error = error
+
+    def _write(self, batch):
+        if self.results_format == 'csv':
+            for trial, results in batch:
+                pd.DataFrame(results).to_csv(os.path.join(self.runs_dir, f'trial_{trial}.csv'), index=False)
+            return
+
+        names = list(batch[0][1])
+        columns = {'trial_id': np.concatenate([np.full(len(results[names[0]]), trial) for trial, results in batch])}
+        for name in names:
+            columns[name] = np.concatenate([np.asarray(results[name], dtype=float) for _, results in batch])
+
+        if self.results_format == 'npz':
+            for name, values in columns.items():
+                self._columns.setdefault(name, []).append(values)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.table(columns)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(os.path.join(self.runs_dir, 'results.parquet'), table.schema)
+            self._parquet_writer.write_table(table)
+
+    def _finish(self):
+        if self.results_format == 'npz':
+            np.savez(os.path.join(self.runs_dir, 'results.npz'),
+                     **{name: np.concatenate(parts) for name, parts in self._columns.items()})
+        elif self.results_format == 'parquet' and self._parquet_writer is not None:
+            self._parquet_writer.close()
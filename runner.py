@@ -0,0 +1,323 @@
+"""
+Long-lived runner that scores many submissions against the same market data.
+
+Starting ``python evaluate.py`` for every submission pays interpreter startup, the pandas and
+NumPy imports and loading the market data each time. The runner instead keeps a pool of warm
+worker processes that have done all of that once, together with the trial plan. For every
+submission a worker forks a child, which inherits the loaded state copy-on-write and then:
+
+- applies CPU-time and address-space limits with setrlimit,
+- purges any imported ``policies`` package and imports the submission's own ``policies/``
+  from its directory, so submissions never see each other's code,
+- evaluates the policy from the submission's config.yaml on the shared trial plan exactly as
+  evaluate.py does, and reports the scores back over a pipe.
+
+The child's console output is captured for the results. The main process writes each result to
+a local SQLite store as soon as it arrives. A submission is a directory in the layout of this
+repository: a policies/ package and a config.yaml.
+
+Process limits rely on fork and the resource module, so the runner needs Linux or macOS.
+
+Example:
+    python runner.py submissions/team_a submissions/team_b --workers 4 --trials 100
+    ls -d submissions/* | python runner.py --stdin        # Serve submissions as they arrive
+"""
+
+import argparse
+import importlib
+import itertools
+import json
+import multiprocessing
+import os
+import select
+import signal
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime
+import numpy as np
+import yaml
+from battery_env import BatteryEnv
+from evaluate import run_trial
+from market_data import BACKENDS, open_market_data
+from stats import ProfitStats
+from trial_plan import TrialPlan, set_seed
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_DB_PATH = os.path.join('results', 'runner.sqlite')
+LOG_LIMIT = 64 * 1024  # Bytes of console output kept per submission
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    submission TEXT NOT NULL,
+    status TEXT NOT NULL,
+    class_name TEXT,
+    parameters TEXT,
+    mean_profit REAL,
+    std_profit REAL,
+    mean_final_profit REAL,
+    num_runs INTEGER,
+    cpu_seconds REAL,
+    wall_seconds REAL,
+    max_rss_mb REAL,
+    error TEXT,
+    log TEXT,
+    finished_at TEXT
+)
+'''
+COLUMNS = ('submission', 'status', 'class_name', 'parameters', 'mean_profit', 'std_profit', 'mean_final_profit',
+           'num_runs', 'cpu_seconds', 'wall_seconds', 'max_rss_mb', 'error', 'log', 'finished_at')
+
+
+class ResultStore:
+    def __init__(self, path=DEFAULT_DB_PATH):
+        """
+        SQLite table of submission results, one row per evaluated submission.
+
+        :param path: Path of the SQLite database; created if missing.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def insert(self, result):
+        """
+        Store one result and commit, so readers see it immediately.
+        """
+        row = dict(result, parameters=json.dumps(result.get('parameters')))
+        self.connection.execute(f'INSERT INTO submissions ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+                                [row.get(column) for column in COLUMNS])
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+_worker_state = {}
+
+def _init_worker(data, backend, plan, seed, limits):
+    # Warm state shared copy-on-write with every submission's child process
+    _worker_state['env'] = BatteryEnv(data=data, backend=backend)
+    _worker_state['plan'] = plan
+    _worker_state['seed'] = seed
+    _worker_state['limits'] = limits
+
+
+def _virtual_memory_bytes():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _apply_limits(cpu_seconds, memory_mb):
+    if cpu_seconds:
+        # SIGXCPU at the soft limit, SIGKILL a second later if it is ignored
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if memory_mb:
+        # The limit is on top of what the child inherits from the warm worker
+        try:
+            inherited = _virtual_memory_bytes()
+        except OSError:
+            inherited = 0
+        limit = inherited + memory_mb * 2**20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _import_submission_policies(submission_dir):
+    for name in [name for name in sys.modules if name == 'policies' or name.startswith('policies.')]:
+        del sys.modules[name]
+    sys.path.insert(0, submission_dir)
+    importlib.invalidate_caches()
+    policies = importlib.import_module('policies')
+    if not os.path.abspath(policies.__file__).startswith(os.path.join(submission_dir, '')):
+        raise ImportError(f'Submission {submission_dir} has no policies package')
+    return policies
+
+
+def _evaluate_submission(submission_dir):
+    # Runs in the forked child, after the limits are applied
+    policies = _import_submission_policies(submission_dir)
+    with open(os.path.join(submission_dir, 'config.yaml')) as file:
+        policy_config = yaml.safe_load(file)['policy']
+    policy = policies.policy_classes[policy_config['class_name']](**policy_config.get('parameters', {}))
+
+    env, plan = _worker_state['env'], _worker_state['plan']
+    set_seed(_worker_state['seed'])
+    profit_stats = ProfitStats()
+    for entry in plan:
+        # Never replay: act_vectorized would hand an untrusted submission the future prices
+        profit_stats.add_trial(run_trial(env, policy, *plan.start_trial(entry), replay=False)[1])
+    final_profits = profit_stats.final_profits
+    return {
+        'class_name': policy_config['class_name'],
+        'parameters': policy_config.get('parameters', {}),
+        'mean_profit': profit_stats.profits.mean,
+        'std_profit': profit_stats.profits.std,
+        'mean_final_profit': float(np.mean(final_profits)),
+        'num_runs': len(plan),
+    }
+
+
+def _child(submission_dir, result_fd, log_fd):
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    try:
+        _apply_limits(*_worker_state['limits'][:2])
+        result = {'status': 'ok', **_evaluate_submission(submission_dir)}
+    except MemoryError:
+        result = {'status': 'memory_limit', 'error': traceback.format_exc()}
+    except BaseException:
+        result = {'status': 'error', 'error': traceback.format_exc()}
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.write(result_fd, json.dumps(result).encode())
+    finally:
+        os._exit(0)
+
+
+def _read_result(result_fd, pid, timeout):
+    # The child writes its result in one go just before exiting; kill it if it overruns the wall clock
+    chunks = []
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        readable, _, _ = select.select([result_fd], [], [], remaining)
+        if not readable:
+            os.kill(pid, signal.SIGKILL)
+            return None
+        chunk = os.read(result_fd, 1 << 16)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b''.join(chunks)) if chunks else None
+
+
+def _run_submission(submission_dir):
+    submission_dir = os.path.abspath(submission_dir)
+    cpu_seconds, memory_mb, timeout = _worker_state['limits']
+    start = time.perf_counter()
+    result_read, result_write = os.pipe()
+    with tempfile.TemporaryFile() as log:
+        pid = os.fork()
+        if pid == 0:
+            os.close(result_read)
+            _child(submission_dir, result_write, log.fileno())
+        os.close(result_write)
+        try:
+            result = _read_result(result_read, pid, timeout)
+        finally:
+            os.close(result_read)
+        _, status, usage = os.wait4(pid, 0)
+
+        if result is None:
+            signaled = os.WTERMSIG(status) if os.WIFSIGNALED(status) else None
+            # SIGXCPU can only come from the CPU limit, and may arrive while the accounted usage is
+            # still just below it. The usage only tells the hard limit's SIGKILL from our timeout's.
+            if signaled == signal.SIGXCPU or (cpu_seconds and signaled == signal.SIGKILL and
+                                              usage.ru_utime + usage.ru_stime >= cpu_seconds):
+                result = {'status': 'cpu_limit', 'error': f'Exceeded the CPU time limit of {cpu_seconds}s'}
+            elif signaled == signal.SIGKILL:
+                result = {'status': 'timeout', 'error': f'Exceeded the wall time limit of {timeout}s'}
+            else:
+                result = {'status': 'error', 'error': f'Submission process exited with status {status}'}
+
+        log.seek(0, os.SEEK_END)
+        log.seek(max(log.tell() - LOG_LIMIT, 0))
+        result['log'] = log.read().decode(errors='replace')
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    max_rss = usage.ru_maxrss / (2**20 if sys.platform == 'darwin' else 2**10)
+    result.update({
+        'submission': submission_dir,
+        'cpu_seconds': usage.ru_utime + usage.ru_stime,
+        'wall_seconds': time.perf_counter() - start,
+        'max_rss_mb': max_rss,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+    })
+    return result
+
+
+class Runner:
+    def __init__(self, data='train.csv', backend='cached', trials=100, seed=42, workers=os.cpu_count(),
+                 cpu_seconds=600, memory_mb=2048, timeout=None, db_path=DEFAULT_DB_PATH):
+        """
+        Pool of warm workers evaluating submissions in isolated, resource-limited child processes.
+
+        :param data: Path to the market data csv file.
+        :param backend: Market data backend of the workers.
+        :param trials: Number of trials per submission.
+        :param seed: Seed of the shared trial plan.
+        :param workers: Number of warm worker processes, i.e. submissions evaluated at once.
+        :param cpu_seconds: CPU time limit per submission; 0 disables it.
+        :param memory_mb: Memory limit per submission, on top of the warm worker's; 0 disables it.
+        :param timeout: Wall time limit per submission in seconds.
+        :param db_path: Path of the SQLite results store.
+        """
+        if resource is None or not hasattr(os, 'fork'):
+            raise OSError('The runner needs fork and the resource module, which this platform does not provide')
+        plan = TrialPlan.cached(data, len(open_market_data(data, backend)), trials, seed)
+        self.store = ResultStore(db_path)
+        self.pool = multiprocessing.get_context('fork').Pool(
+            workers, initializer=_init_worker, initargs=(data, backend, plan, seed, (cpu_seconds, memory_mb, timeout)))
+
+    def run(self, submissions):
+        """
+        Evaluate submissions and store each result as it completes, in completion order.
+
+        :param submissions: Iterable of submission directories; it is consumed lazily, so it may
+                            keep yielding new submissions while earlier ones run.
+        :return: Generator of result dictionaries.
+        """
+        for result in self.pool.imap_unordered(_run_submission, submissions):
+            self.store.insert(result)
+            yield result
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate submissions with a pool of warm, sandboxed workers.')
+    parser.add_argument('submissions', nargs='*', help='Submission directories, each with policies/ and config.yaml')
+    parser.add_argument('--stdin', action='store_true', help='Also read submission directories from stdin, one per line')
+    parser.add_argument('--data', type=str, default='train.csv', help='Path to the market data csv file')
+    parser.add_argument('--backend', type=str, default='cached', choices=BACKENDS, help='Market data backend')
+    parser.add_argument('--trials', type=int, default=100, help='Number of trials per submission')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the trial plan')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of warm worker processes')
+    parser.add_argument('--cpu_seconds', type=int, default=600, help='CPU time limit per submission; 0 disables it')
+    parser.add_argument('--memory_mb', type=int, default=2048, help='Memory limit per submission in MB; 0 disables it')
+    parser.add_argument('--timeout', type=float, help='Wall time limit per submission in seconds')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Path of the SQLite results store')
+    args = parser.parse_args()
+
+    submissions = list(args.submissions)
+    if args.stdin:
+        submissions = itertools.chain(submissions, (line.strip() for line in sys.stdin if line.strip()))
+    with Runner(args.data, args.backend, args.trials, args.seed, args.workers, args.cpu_seconds, args.memory_mb,
+                args.timeout, args.db) as runner:
+        for result in runner.run(submissions):
+            score = f'mean profit {result["mean_profit"]:.2f}' if result['status'] == 'ok' else result['error'].strip().splitlines()[-1]
+            print(f'{result["submission"]}: {result["status"]}, {score} ({result["wall_seconds"]:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Streaming statistics of evaluation results.
+
+Evaluating a policy produces one cumulative profit per step of every trial, which for year-long
+data and 1000 trials is far too many values to keep. ProfitStats folds each trial into running
+aggregates as it completes, using memory that does not grow with the episode length:
+
+- RunningStats: count, mean and variance, merged batch by batch with the parallel form of
+  Welford's algorithm (Chan et al.), which avoids the cancellation of summing squares.
+- QuantileSketch: a logarithmically bucketed histogram (as in DDSketch) answering quantile
+  queries to a fixed relative accuracy, whose size depends on the range of the values rather
+  than their number.
+- The final profit of every trial, one value per trial, from which bootstrap_ci draws a
+  confidence interval on the mean score with vectorized resampling.
+"""
+
+import math
+import numpy as np
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class RunningStats:
+    def __init__(self):
+        """
+        Count, mean and variance of a stream of values, updated with whole arrays at a time.
+        """
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        n = len(values)
+        if n == 0:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(np.square(values - batch_mean).sum())
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def merge(self, other):
+        """
+        Combine with the statistics of another stream, e.g. from a worker process.
+        """
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / total
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """
+        Population variance, as np.var.
+        """
+        return self._m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Mergeable sketch answering quantile queries with a bounded relative error.
+
+        :param relative_accuracy: Any quantile is returned within this fraction of a true value
+                                  at that rank, e.g. 0.01 for 1%.
+        """
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive = {}
+        self._negative = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _add_counts(self, buckets, magnitudes):
+        if len(magnitudes) == 0:
+            return
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        offset = int(keys.min())
+        counts = np.bincount(keys - offset)
+        for key in np.flatnonzero(counts).tolist():
+            buckets[key + offset] = buckets.get(key + offset, 0) + int(counts[key])
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        # Magnitudes too small to bucket are counted as zero
+        tiny = np.abs(values) < 1e-12
+        self.zeros += int(tiny.sum())
+        self._add_counts(self._positive, values[(values > 0) & ~tiny])
+        self._add_counts(self._negative, -values[(values < 0) & ~tiny])
+        self.count += len(values)
+
+    def merge(self, other):
+        for buckets, other_buckets in ((self._positive, other._positive), (self._negative, other._negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, key, sign):
+        # Midpoint of the bucket (gamma^(key-1), gamma^key] with the guaranteed relative error
+        return sign * 2 * self._gamma ** key / (self._gamma + 1)
+
+    def quantile(self, q):
+        """
+        Return the value at quantile q in [0, 1], or NaN for an empty sketch.
+        """
+        if self.count == 0:
+            return float('nan')
+        rank = q * (self.count - 1)
+        seen = 0
+        # Ascending order: most negative first, then zeros, then positive values
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return self._value(key, -1)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._value(key, 1)
+        return self._value(max(self._positive), 1)
+
+
+def bootstrap_ci(values, statistic=np.mean, n_resamples=10000, confidence=0.95, seed=0, batch_size=1000):
+    """
+    Percentile bootstrap confidence interval of a statistic, resampling in vectorized batches.
+
+    :param values: One-dimensional sample, e.g. the final profit of every trial.
+    :param statistic: Function reducing a 2-D array of resamples along axis=1, such as np.mean or np.median.
+    :param n_resamples: Number of bootstrap resamples.
+    :param confidence: Confidence level of the interval.
+    :param seed: Seed of the resampling.
+    :param batch_size: Resamples drawn at a time, which bounds memory to batch_size x len(values).
+    :return: Lower and upper bound of the interval, NaN for an empty sample.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return float('nan'), float('nan')
+    rng = np.random.default_rng(seed)
+    estimates = np.empty(n_resamples)
+    for start in range(0, n_resamples, batch_size):
+        size = min(batch_size, n_resamples - start)
+        estimates[start:start + size] = statistic(values[rng.integers(0, len(values), (size, len(values)))], axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(estimates, [alpha, 1 - alpha])
+    return float(low), float(high)
+
+
+class ProfitStats:
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Streaming aggregate of the cumulative profits of every step and the final profit of every trial.
+
+        :param relative_accuracy: Relative accuracy of the profit quantiles.
+        """
+        self.profits = RunningStats()
+        self.sketch = QuantileSketch(relative_accuracy)
+        self._final_profits = []
+
+    def add_trial(self, profits):
+        """
+        Fold in the cumulative profit of every step of one trial.
+        """
+        profits = np.asarray(profits, dtype=float)
+        self.profits.update(profits)
+        self.sketch.update(profits)
+        self._final_profits.append(float(profits[-1]) if len(profits) else 0.0)
+
+    @property
+    def final_profits(self):
+        return np.array(self._final_profits)
+
+    def summary(self, quantiles=DEFAULT_QUANTILES, n_resamples=10000, confidence=0.95, seed=0):
+        """
+        Return the statistics written to config_stats.yaml.
+        """
+        final_profits = self.final_profits
+        ci_low, ci_high = bootstrap_ci(final_profits, np.mean, n_resamples, confidence, seed)
+        summary = {
+            'mean_profit': float(self.profits.mean),
+            'std_profit': float(self.profits.std),
+            'profit_quantiles': {f'p{round(q * 100):02d}': float(self.sketch.quantile(q)) for q in quantiles},
+            'mean_final_profit': float(np.mean(final_profits)) if len(final_profits) else 0.0,
+            'std_final_profit': float(np.std(final_profits)) if len(final_profits) else 0.0,
+            'final_profit_ci_low': ci_low,
+            'final_profit_ci_high': ci_high,
+            'ci_confidence': confidence,
+        }
+        return summary
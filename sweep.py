@@ -0,0 +1,204 @@
+"""
+Parallel hyperparameter sweep for a policy class.
+
+All configurations are scored on the same trial plan (see trial_plan.py), the same one
+evaluate.py uses for the dataset and seed. Work is spread over a process pool whose workers load the market data once, and
+successive halving stops poor configurations early: every configuration is scored on a small
+number of trials, the best 1/eta are promoted to eta times as many trials, and so on until the
+survivors have been scored on every trial. The result is one ranked leaderboard table.
+
+Each (configuration, trial) pair runs with a fresh policy instance so scores do not depend on
+how work is scheduled across workers. For stateful policies, such as RollingAveragePolicy with its
+price window, the scores therefore differ from evaluate.py, whose serial loop carries one policy
+instance across trials; they match evaluate.py --vectorized.
+
+Example:
+    python sweep.py --class_name RollingAveragePolicy --grid window_size=10,50,100,500 --trials 100 --workers 8
+    python sweep.py --class_name RollingAveragePolicy --random window_size=logint:5:5000 --samples 30
+"""
+
+import argparse
+import itertools
+import math
+import multiprocessing
+import os
+import random
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from battery_env import BatteryEnv
+from evaluate import run_trial
+from market_data import BACKENDS
+from policies import policy_classes
+from trial_plan import TrialPlan
+
+
+def parse_grid(grid_list):
+    """
+    Parse 'key=value1,value2,...' items into the list of all parameter combinations.
+    """
+    names, values = [], []
+    for item in grid_list:
+        key, options = item.split('=', 1)
+        names.append(key)
+        values.append([eval(option) for option in options.split(',')])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def parse_random(random_list, samples, seed):
+    """
+    Parse 'key=kind:low:high' items, where kind is int, float, log (log-uniform float) or
+    logint (log-uniform integer), and draw a number of random parameter combinations.
+    """
+    rng = random.Random(seed)
+    specs = []
+    for item in random_list:
+        key, spec = item.split('=', 1)
+        kind, low, high = spec.split(':')
+        specs.append((key, kind, float(low), float(high)))
+
+    configs = []
+    for _ in range(samples):
+        config = {}
+        for key, kind, low, high in specs:
+            if kind == 'int':
+                config[key] = rng.randint(int(low), int(high))
+            elif kind == 'float':
+                config[key] = rng.uniform(low, high)
+            elif kind in ('log', 'logint'):
+                value = math.exp(rng.uniform(math.log(low), math.log(high)))
+                config[key] = int(round(value)) if kind == 'logint' else value
+            else:
+                raise ValueError(f'Unknown random search kind {kind!r}, expected int, float, log or logint')
+        configs.append(config)
+    return configs
+
+
+def rung_sizes(trials, min_trials, eta):
+    """
+    Return the number of trials each successive halving rung scores its configurations on.
+    """
+    if min_trials < 1 or eta < 2:
+        raise ValueError(f'Successive halving needs min_trials >= 1 and eta >= 2, got {min_trials} and {eta}')
+    sizes = []
+    size = min(min_trials, trials)
+    while size < trials:
+        sizes.append(size)
+        size *= eta
+    sizes.append(trials)
+    return sizes
+
+
+_worker_state = {}
+
+def _init_worker(class_name, data, backend, plan):
+    _worker_state['env'] = BatteryEnv(data=data, backend=backend)
+    _worker_state['policy_class'] = policy_classes[class_name]
+    _worker_state['plan'] = plan
+
+def _score_trial(task):
+    config, trial = task
+    plan = _worker_state['plan']
+    policy = _worker_state['policy_class'](**config)
+    profits = run_trial(_worker_state['env'], policy, *plan.start_trial(plan[trial]))[1]
+    final_profit = float(profits[-1]) if len(profits) else 0.0
+    return float(np.sum(profits)), len(profits), final_profit
+
+
+def successive_halving(pool, configs, sizes, eta):
+    """
+    Score configurations rung by rung, promoting the best 1/eta of each rung to the next.
+
+    :return: Per-configuration lists of (profit sum, step count, final profit) for every trial scored.
+    """
+    scores = [[] for _ in configs]
+    survivors = list(range(len(configs)))
+    for rung, size in enumerate(sizes):
+        tasks = [(index, trial) for index in survivors for trial in range(len(scores[index]), size)]
+        results = pool.imap(_score_trial, [(configs[index], trial) for index, trial in tasks], chunksize=4)
+        for (index, _), result in zip(tasks, results):
+            scores[index].append(result)
+        print(f'Rung {rung}: scored {len(survivors)} configurations on {size} trials')
+
+        if rung < len(sizes) - 1:
+            keep = max(1, len(survivors) // eta)
+            survivors = sorted(survivors, key=lambda index: -mean_profit(scores[index]))[:keep]
+    return scores
+
+
+def mean_profit(trial_scores):
+    """
+    Mean cumulative profit over every step of every trial. This is the statistic of evaluate.py's
+    mean_profit, but each trial here is run with a fresh policy instance, whereas evaluate.py
+    carries one instance across its trials, so stateful policies score differently there.
+    """
+    steps = sum(count for _, count, _ in trial_scores)
+    return sum(total for total, _, _ in trial_scores) / steps if steps else 0.0
+
+
+def leaderboard(configs, scores):
+    """
+    Build the ranked leaderboard, best mean profit on the most trials first.
+    """
+    rows = []
+    for config, trial_scores in zip(configs, scores):
+        final_profits = [final for _, _, final in trial_scores]
+        rows.append({
+            **config,
+            'trials': len(trial_scores),
+            'mean_profit': mean_profit(trial_scores),
+            'mean_final_profit': float(np.mean(final_profits)),
+            'std_final_profit': float(np.std(final_profits)),
+        })
+    table = pd.DataFrame(rows).sort_values(['trials', 'mean_profit'], ascending=False, ignore_index=True)
+    table.index = pd.RangeIndex(1, len(table) + 1, name='rank')
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep the parameters of a policy class.')
+    parser.add_argument('--class_name', type=str, required=True, help='Policy class name')
+    parser.add_argument('--grid', action='append', default=[], help='Grid values as key=value1,value2,...')
+    parser.add_argument('--random', action='append', default=[], help='Random search ranges as key=int|float|log|logint:low:high')
+    parser.add_argument('--samples', type=int, default=20, help='Number of random search configurations')
+    parser.add_argument('--trials', type=int, default=100, help='Number of trials the surviving configurations are scored on')
+    parser.add_argument('--min_trials', type=int, default=10, help='Number of trials in the first successive halving rung')
+    parser.add_argument('--eta', type=int, default=3, help='Fraction 1/eta of configurations promoted at each rung')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for trial sampling and random search')
+    parser.add_argument('--plan', type=str, help='Path to a saved trial plan (trial_plan.npz) to score on instead of sampling trials')
+    parser.add_argument('--data', type=str, default='train.csv', help='Path to the market data csv file')
+    parser.add_argument('--backend', type=str, default='cached', choices=BACKENDS, help='Market data backend')
+    args = parser.parse_args()
+
+    if bool(args.grid) == bool(args.random):
+        parser.error('Specify either --grid or --random')
+    if args.min_trials < 1:
+        parser.error('--min_trials must be at least 1')
+    if args.eta < 2:
+        parser.error('--eta must be at least 2')
+    configs = parse_grid(args.grid) if args.grid else parse_random(args.random, args.samples, args.seed)
+    n_rows = len(BatteryEnv(data=args.data, backend=args.backend).market_data)
+    if args.plan:
+        plan = TrialPlan.load(args.plan)
+        plan.check(n_rows)
+        args.trials = len(plan)
+    else:
+        plan = TrialPlan.cached(args.data, n_rows, args.trials, args.seed)
+    sizes = rung_sizes(args.trials, args.min_trials, args.eta)
+    print(f'Sweeping {len(configs)} configurations of {args.class_name} over rungs of {sizes} trials')
+
+    with multiprocessing.Pool(args.workers, initializer=_init_worker,
+                              initargs=(args.class_name, args.data, args.backend, plan)) as pool:
+        scores = successive_halving(pool, configs, sizes, args.eta)
+
+    table = leaderboard(configs, scores)
+    print(table.to_string())
+
+    results_dir = os.path.join('results', f'{datetime.now().strftime("%Y%m%d_%H%M%S")}_sweep_{args.class_name}')
+    os.makedirs(results_dir, exist_ok=True)
+    table.to_csv(os.path.join(results_dir, 'leaderboard.csv'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+"""
+Seeded synthetic market data at scale.
+
+gen_data.py draws one day of independent uniform prices, which is enough to smoke-test a policy
+but has none of the structure a policy trades on and cannot produce benchmark-sized datasets.
+This module generates years of 5-minute data for several NEM-like regions in the train.csv
+format, one chunk of whole days at a time, so memory is bounded by the chunk and not the output.
+
+Each region's series are built from a few interacting components:
+
+- Temperature: an annual cycle (southern hemisphere, warmest in January), a diurnal cycle
+  peaking mid-afternoon and slowly varying weather noise.
+- Cloud_Cover: a persistent random process squashed into 0-100%.
+- Energy_Demand: morning and evening peaks, a weekend dip, extra load in hot and cold weather,
+  less rooftop-solar-served load on clear days, and noise.
+- Market_Price: a base price moving with demand, pushed down by solar output (negative around
+  midday in solar-heavy regions, floored at the market floor), correlated noise shared with the
+  other regions through a common market factor, and rare price spikes up to the market cap,
+  which are more likely when demand is high.
+
+The random streams are seeded per region and per component from one seed with
+np.random.SeedSequence, and the noise processes are advanced in blocks aligned to absolute
+steps, so the output depends only on the seed, start date and region, never on the chunk size
+or on which other regions are generated.
+
+Output is either a CSV per region, appended chunk by chunk, or a directory per region holding
+one ``.npy`` file per column and a ``columns.json`` manifest (the binary cache layout), written
+through memory maps. Every market data backend loads such a directory directly, without parsing.
+
+Example:
+    python synthetic_data.py --preset large --format npy --output data/large
+    python evaluate.py --data data/large/NSW1 --backend columnar
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+STEPS_PER_DAY = 288
+STEP = np.timedelta64(5, 'm')
+COLUMNS = ('Timestamp', 'Market_Price', 'Temperature', 'Cloud_Cover', 'Energy_Demand')
+FORMATS = ('csv', 'npy')
+PRICE_FLOOR = -1000.0
+PRICE_CAP = 15500.0
+DEFAULT_CHUNK_DAYS = 30
+# Length of the blocks in which the AR(1) noise processes are advanced; whole days are a multiple
+_AR_BLOCK = 96
+
+# Region parameters: mean and annual swing of temperature (C), mean demand (MW), share of the
+# demand met by rooftop solar at full sun, base price ($/MWh), solar price suppression ($/MWh at
+# full sun), price noise level and correlation with the common market factor, and the spike rate
+# per step at average demand.
+REGIONS = {
+    'NSW1': dict(temperature=18.0, temperature_swing=6.0, demand=8000.0, solar_share=0.10, price=85.0,
+                 solar_discount=70.0, price_noise=12.0, correlation=0.7, spike_rate=2e-4),
+    'QLD1': dict(temperature=22.0, temperature_swing=4.5, demand=6500.0, solar_share=0.15, price=80.0,
+                 solar_discount=95.0, price_noise=14.0, correlation=0.6, spike_rate=2.5e-4),
+    'VIC1': dict(temperature=15.0, temperature_swing=5.5, demand=5500.0, solar_share=0.12, price=75.0,
+                 solar_discount=90.0, price_noise=12.0, correlation=0.7, spike_rate=1.5e-4),
+    'SA1': dict(temperature=17.5, temperature_swing=6.5, demand=1500.0, solar_share=0.35, price=90.0,
+                solar_discount=160.0, price_noise=20.0, correlation=0.5, spike_rate=4e-4),
+    'TAS1': dict(temperature=12.0, temperature_swing=4.0, demand=1100.0, solar_share=0.05, price=60.0,
+                 solar_discount=25.0, price_noise=8.0, correlation=0.4, spike_rate=5e-5),
+}
+
+# Standard benchmark datasets: days of data and regions generated
+PRESETS = {
+    'small': dict(days=30, regions=('NSW1',)),
+    'medium': dict(days=365, regions=('NSW1',)),
+    'large': dict(days=3 * 365, regions=tuple(REGIONS)),
+}
+
+# Component streams of each region, in SeedSequence order
+_STREAMS = ('temperature', 'cloud', 'demand', 'price', 'spike_start', 'spike_length', 'spike_size')
+_COMMON_STREAM = len(REGIONS)
+
+
+class _AR1:
+    def __init__(self, rng, phi, sigma):
+        """
+        First-order autoregressive noise x[t] = phi * x[t-1] + sigma * e[t], started from its
+        stationary distribution and carried across chunks.
+        """
+        self.rng = rng
+        self.phi = phi
+        self.sigma = sigma
+        self.value = rng.standard_normal() * sigma / np.sqrt(1 - phi ** 2)
+        powers = phi ** np.arange(_AR_BLOCK)
+        # Lower-triangular weights phi^(i-j), so a block is one matrix product of its innovations
+        self._weights = np.tril(powers[:, None] / powers[None, :])
+        self._powers = phi * powers
+
+    def sample(self, n):
+        innovations = self.sigma * self.rng.standard_normal(n)
+        values = np.empty(n)
+        for start in range(0, n, _AR_BLOCK):
+            block = innovations[start:start + _AR_BLOCK]
+            size = len(block)
+            values[start:start + size] = (self._weights[:size, :size] @ block
+                                          + self._powers[:size] * self.value)
+            self.value = values[start + size - 1]
+        return values
+
+
+class _Spikes:
+    def __init__(self, start_rng, length_rng, size_rng, rate):
+        """
+        Jump process of price spikes. A spike starts with a per-step probability that rises with
+        demand, lasts a geometrically distributed number of steps and adds a lognormal amount.
+        Lengths and sizes are drawn from their own streams for every candidate start, including
+        those inside a running spike, so the draws line up whatever the chunk size.
+        """
+        self.start_rng = start_rng
+        self.length_rng = length_rng
+        self.size_rng = size_rng
+        self.rate = rate
+        self.remaining = 0
+        self.size = 0.0
+
+    def sample(self, demand_ratio):
+        n = len(demand_ratio)
+        probability = np.minimum(self.rate * np.exp(6.0 * (demand_ratio - 1)), 0.05)
+        starts = np.flatnonzero(self.start_rng.random(n) < probability)
+        lengths = self.length_rng.geometric(0.25, len(starts))
+        sizes = np.exp(self.size_rng.normal(np.log(600.0), 1.2, len(starts)))
+        spikes = np.zeros(n)
+        # Continue a spike running over from the previous chunk
+        carried = min(self.remaining, n)
+        spikes[:carried] = self.size
+        self.remaining -= carried
+        end = carried
+        for start, length, size in zip(starts.tolist(), lengths.tolist(), sizes.tolist()):
+            if start < end:
+                continue  # Inside a running spike
+            end = start + length
+            spikes[start:end] = size
+            if end > n:
+                self.remaining = end - n
+                self.size = size
+        return spikes
+
+
+class RegionGenerator:
+    def __init__(self, region, start='2024-01-01', seed=0):
+        """
+        Generator of one region's market data, producing consecutive chunks of whole days.
+
+        :param region: Name of the region, a key of REGIONS.
+        :param start: Date of the first interval.
+        :param seed: Seed shared by all regions of a dataset.
+        """
+        if region not in REGIONS:
+            raise ValueError(f'Unknown region {region!r}, expected one of {tuple(REGIONS)}')
+        self.region = region
+        self.params = REGIONS[region]
+        self.start = np.datetime64(pd.Timestamp(start).normalize().to_datetime64(), 'm')
+        self.step = 0
+
+        index = list(REGIONS).index(region)
+        streams = [np.random.default_rng(np.random.SeedSequence([seed, index, i])) for i in range(len(_STREAMS))]
+        rngs = dict(zip(_STREAMS, streams))
+        common = np.random.default_rng(np.random.SeedSequence([seed, _COMMON_STREAM]))
+        self._temperature_noise = _AR1(rngs['temperature'], 0.995, 0.15)
+        self._cloud_noise = _AR1(rngs['cloud'], 0.99, 0.25)
+        self._demand_noise = _AR1(rngs['demand'], 0.98, 0.004)
+        self._price_noise = _AR1(rngs['price'], 0.97, np.sqrt(1 - 0.97 ** 2))
+        self._market_noise = _AR1(common, 0.97, np.sqrt(1 - 0.97 ** 2))
+        self._spikes = _Spikes(rngs['spike_start'], rngs['spike_length'], rngs['spike_size'],
+                               self.params['spike_rate'])
+
+    def generate(self, days):
+        """
+        Generate the next days of 5-minute intervals.
+
+        :param days: Number of days in the chunk.
+        :return: Dictionary mapping the train.csv column names to arrays; 'Timestamp' is datetime64.
+        """
+        p = self.params
+        n = days * STEPS_PER_DAY
+        steps = self.step + np.arange(n)
+        self.step += n
+        timestamps = self.start + steps * STEP
+        hours = (steps % STEPS_PER_DAY) / 12
+        days_since_start = timestamps.astype('datetime64[D]')
+        day_of_year = (days_since_start - days_since_start.astype('datetime64[Y]')).astype(int)
+        # 1970-01-01 was a Thursday; Saturday and Sunday are 5 and 6 counting from Monday
+        weekend = ((days_since_start.astype(int) + 3) % 7) >= 5
+        season = np.cos(2 * np.pi * (day_of_year - 15) / 365.25)
+
+        temperature = (p['temperature'] + p['temperature_swing'] * season
+                       - 4.0 * np.cos(2 * np.pi * (hours - 15) / 24) + self._temperature_noise.sample(n))
+        cloud_cover = 100 / (1 + np.exp(-(self._cloud_noise.sample(n) - 0.5)))
+        solar = (np.maximum(np.sin(np.pi * (hours - 6) / 12), 0) * (1 - 0.75 * cloud_cover / 100)
+                 * (1 + 0.25 * season))
+
+        profile = (0.9 + 0.12 * np.exp(-(hours - 8) ** 2 / 4.5) + 0.25 * np.exp(-(hours - 18.5) ** 2 / 8)
+                   - 0.12 * np.exp(-(hours - 3.5) ** 2 / 12))
+        weather = 1 + 0.015 * np.abs(temperature - 19)
+        demand_ratio = (profile * np.where(weekend, 0.9, 1.0) * weather * (1 + self._demand_noise.sample(n))
+                        - p['solar_share'] * solar)
+        energy_demand = p['demand'] * demand_ratio
+
+        correlation = p['correlation']
+        noise = (correlation * self._market_noise.sample(n)
+                 + np.sqrt(1 - correlation ** 2) * self._price_noise.sample(n))
+        market_price = (p['price'] * (1 + 2.5 * (demand_ratio - 1)) - p['solar_discount'] * solar
+                        + p['price_noise'] * noise + self._spikes.sample(demand_ratio))
+        market_price = np.clip(market_price, PRICE_FLOOR, PRICE_CAP)
+
+        return {
+            'Timestamp': timestamps,
+            'Market_Price': market_price,
+            'Temperature': temperature,
+            'Cloud_Cover': cloud_cover,
+            'Energy_Demand': energy_demand,
+        }
+
+    def chunks(self, days, chunk_days=DEFAULT_CHUNK_DAYS):
+        """
+        Yield the next days of data in chunks of at most chunk_days days.
+        """
+        for offset in range(0, days, chunk_days):
+            yield self.generate(min(chunk_days, days - offset))
+
+
+def _timestamp_strings(timestamps):
+    # Same text as the Timestamp column of train.csv, e.g. '2024-01-01 00:05:00'
+    return np.char.replace(np.datetime_as_string(timestamps, unit='s'), 'T', ' ')
+
+
+def write_csv(path, generator, days, chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    Write a region's data to a CSV in the train.csv format, appending one chunk at a time.
+
+    :return: Number of rows written.
+    """
+    rows = 0
+    with open(path, 'w', newline='') as file:
+        for chunk in generator.chunks(days, chunk_days):
+            pd.DataFrame(chunk).to_csv(file, index=False, header=rows == 0)
+            rows += len(chunk['Timestamp'])
+    return rows
+
+
+def write_npy(path, generator, days, chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    Write a region's data to a directory of ``.npy`` columns, filling preallocated memory maps
+    one chunk at a time. The directory loads with ColumnarMarketData.from_directory.
+
+    :return: Number of rows written.
+    """
+    os.makedirs(path, exist_ok=True)
+    rows = days * STEPS_PER_DAY
+    columns = [np.lib.format.open_memmap(os.path.join(path, f'{i}.npy'), mode='w+',
+                                         dtype='U19' if name == 'Timestamp' else np.float64, shape=(rows,))
+               for i, name in enumerate(COLUMNS)]
+    offset = 0
+    for chunk in generator.chunks(days, chunk_days):
+        size = len(chunk['Timestamp'])
+        columns[0][offset:offset + size] = _timestamp_strings(chunk['Timestamp'])
+        for column, name in zip(columns[1:], COLUMNS[1:]):
+            column[offset:offset + size] = chunk[name]
+        offset += size
+    for column in columns:
+        column.flush()
+    del columns
+    # The manifest is written last, so a directory with one is complete
+    with open(os.path.join(path, 'columns.json'), 'w') as file:
+        json.dump(list(COLUMNS), file)
+    return rows
+
+
+WRITERS = {'csv': write_csv, 'npy': write_npy}
+
+
+def generate_dataset(output, days=365, regions=('NSW1',), start='2024-01-01', seed=0, fmt='csv',
+                     chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    Generate a dataset with one file (CSV) or directory (npy) per region.
+
+    :param output: Directory to write the dataset to.
+    :param days: Number of days of 5-minute intervals per region.
+    :param regions: Names of the regions to generate.
+    :param start: Date of the first interval.
+    :param seed: Seed of the dataset; the same seed always produces the same data.
+    :param fmt: Output format, 'csv' or 'npy'.
+    :param chunk_days: Days generated at a time, which bounds memory use.
+    :return: Dictionary mapping each region to the path written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f'Unknown output format {fmt!r}, expected one of {FORMATS}')
+    os.makedirs(output, exist_ok=True)
+    paths = {}
+    for region in regions:
+        path = os.path.join(output, f'{region}.csv' if fmt == 'csv' else region)
+        WRITERS[fmt](path, RegionGenerator(region, start, seed), days, chunk_days)
+        paths[region] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic NEM-like 5-minute market data.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Standard dataset size; --days and --regions override it')
+    parser.add_argument('--days', type=int, help='Days of data per region (default 365)')
+    parser.add_argument('--regions', type=str, help=f'Comma-separated regions out of {",".join(REGIONS)} (default NSW1)')
+    parser.add_argument('--start', type=str, default='2024-01-01', help='Date of the first interval')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset')
+    parser.add_argument('--format', type=str, default='csv', choices=FORMATS, help='Output format')
+    parser.add_argument('--chunk_days', type=int, default=DEFAULT_CHUNK_DAYS, help='Days generated at a time')
+    parser.add_argument('--output', type=str, default=os.path.join('data', 'synthetic'), help='Output directory')
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset] if args.preset else PRESETS['medium']
+    days = args.days if args.days is not None else preset['days']
+    regions = args.regions.split(',') if args.regions else preset['regions']
+    paths = generate_dataset(args.output, days, regions, args.start, args.seed, args.format, args.chunk_days)
+    for region, path in paths.items():
+        print(f'{region}: {days * STEPS_PER_DAY} rows written to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Equivalence tests of the battery kernels against Battery and BatteryEnv.process_action.
+
+Run with ``python -m pytest test_battery_kernel.py``. The numba kernel is tested when numba is installed.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from battery_env import Battery, BatteryEnv
+from battery_kernel import KERNELS, numba_available, simulate_episodes, step_batteries
+
+CAPACITY, CHARGE_RATE, DISCHARGE_RATE, EFFICIENCY = 100, 50, 50, 0.9
+
+kernels = [pytest.param(kernel, marks=pytest.mark.skipif(kernel == 'numba' and not numba_available(),
+                                                         reason='numba is not installed'))
+           for kernel in KERNELS]
+
+
+def random_actions(rng, shape):
+    # Partial, full-rate and zero actions, which drive batteries into both the empty and the full clamp
+    actions = rng.uniform(-DISCHARGE_RATE, CHARGE_RATE, shape)
+    kind = rng.integers(0, 4, shape)
+    actions[kind == 1] = CHARGE_RATE
+    actions[kind == 2] = -DISCHARGE_RATE
+    actions[kind == 3] = 0.0
+    return actions
+
+
+def reference(actions, prices, initial_socs, initial_profits):
+    # process_action does not read the market data; a one-row frame keeps the test independent of the working directory
+    env = BatteryEnv(CAPACITY, CHARGE_RATE, DISCHARGE_RATE, data=pd.DataFrame({'Market_Price': [0.0]}))
+    profits = np.empty(actions.shape)
+    socs = np.empty(actions.shape)
+    for episode in range(len(actions)):
+        env.battery = Battery(CAPACITY, CHARGE_RATE, DISCHARGE_RATE, initial_socs[episode], EFFICIENCY)
+        total_profit = initial_profits[episode]
+        for step, (action, price) in enumerate(zip(actions[episode].tolist(), prices[episode].tolist())):
+            total_profit += env.process_action(action, price)
+            profits[episode, step] = total_profit
+            socs[episode, step] = env.battery.state_of_charge
+    return profits, socs
+
+
+def assert_bit_identical(actual, expected):
+    assert actual.dtype == expected.dtype == np.float64
+    np.testing.assert_array_equal(actual.view(np.int64), expected.view(np.int64))
+
+
+@pytest.fixture
+def episodes():
+    rng = np.random.default_rng(0)
+    actions = random_actions(rng, (16, 500))
+    prices = rng.uniform(-100, 300, actions.shape)
+    # Start empty, full and in between, with and without profit carried over
+    initial_socs = np.linspace(0, CAPACITY, len(actions))
+    initial_profits = np.where(np.arange(len(actions)) % 2, rng.uniform(-500, 500, len(actions)), 0.0)
+    return actions, prices, initial_socs, initial_profits
+
+
+@pytest.mark.parametrize('kernel', kernels)
+def test_simulate_episodes_matches_battery(kernel, episodes):
+    actions, prices, initial_socs, initial_profits = episodes
+    expected_profits, expected_socs = reference(actions, prices, initial_socs, initial_profits)
+    profits, socs = simulate_episodes(actions, prices, initial_socs, CAPACITY, CHARGE_RATE, DISCHARGE_RATE, EFFICIENCY,
+                                      initial_profits=initial_profits, kernel=kernel)
+    assert_bit_identical(profits, expected_profits)
+    assert_bit_identical(socs, expected_socs)
+
+
+@pytest.mark.parametrize('kernel', kernels)
+def test_simulate_episodes_clamps(kernel):
+    # Charging a full battery and discharging an empty one add and remove nothing, at any price
+    actions = np.array([[CHARGE_RATE] * 20, [-DISCHARGE_RATE] * 20, [CHARGE_RATE, -DISCHARGE_RATE] * 10])
+    prices = np.full(actions.shape, 42.0)
+    initial_socs = np.array([CAPACITY - 1.0, 1.0, 0.0])
+    initial_profits = np.array([10.0, -10.0, 0.0])
+    expected_profits, expected_socs = reference(actions, prices, initial_socs, initial_profits)
+    profits, socs = simulate_episodes(actions, prices, initial_socs, CAPACITY, CHARGE_RATE, DISCHARGE_RATE, EFFICIENCY,
+                                      initial_profits=initial_profits, kernel=kernel)
+    assert_bit_identical(profits, expected_profits)
+    assert_bit_identical(socs, expected_socs)
+    assert socs[0, -1] == CAPACITY and socs[1, -1] == 0.0
+    assert profits[0, -1] == profits[0, 2] and profits[1, -1] == profits[1, 2]
+
+
+def test_step_batteries_matches_battery(episodes):
+    actions, prices, initial_socs, initial_profits = episodes
+    expected_profits, expected_socs = reference(actions, prices, initial_socs, initial_profits)
+    soc, total_profit = initial_socs, initial_profits
+    for step in range(actions.shape[1]):
+        soc, profit_delta = step_batteries(soc, actions[:, step], prices[:, step], CAPACITY, CHARGE_RATE,
+                                           DISCHARGE_RATE, EFFICIENCY)
+        total_profit = total_profit + profit_delta
+        assert_bit_identical(soc, expected_socs[:, step])
+        assert_bit_identical(total_profit, expected_profits[:, step])
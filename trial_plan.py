@@ -0,0 +1,149 @@
+"""
+Precomputed, serializable trial plans.
+
+A trial plan fixes the (start_step, episode_length, initial_soc, seed) of every trial for one
+dataset and seed. Every policy and sweep configuration evaluated with the same plan runs on the
+same windows (common random numbers), so paired comparisons need far fewer trials, and the plan
+is drawn once and cached on disk rather than re-sampled for every run.
+
+Episodes are sampled exactly as evaluate.py always has: seeding with seed + trial and drawing
+the start step and episode length from Python's random module. Starting a planned trial repeats
+those draws, which leaves the random state where the original evaluation loop left it, so
+stochastic policies see the same random numbers as before.
+"""
+
+import os
+import random
+import numpy as np
+from market_data import DEFAULT_CACHE_DIR, file_digest
+
+PLAN_DTYPE = np.dtype([
+    ('start_step', np.int64),
+    ('episode_length', np.int64),
+    ('initial_soc', np.float64),
+    ('seed', np.int64),
+])
+DEFAULT_PLAN_DIR = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), 'trial_plans')
+
+
+def set_seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def sample_episode(seed, n_rows):
+    set_seed(seed)
+    start_step = random.randint(0, n_rows - 1)
+    episode_length = random.randint(1, n_rows - start_step)
+    return start_step, episode_length
+
+
+class TrialPlan:
+    def __init__(self, entries, n_rows):
+        """
+        :param entries: Structured array of PLAN_DTYPE, one entry per trial. An initial_soc of
+                        NaN means the environment's default initial charge.
+        :param n_rows: Number of rows of the market data the plan was drawn for.
+        """
+        self.entries = np.asarray(entries, dtype=PLAN_DTYPE)
+        self.n_rows = n_rows
+
+    @classmethod
+    def generate(cls, n_rows, trials, seed, soc_range=None):
+        """
+        Draw a plan for market data with n_rows rows.
+
+        :param n_rows: Number of rows of the market data.
+        :param trials: Number of trials.
+        :param seed: Base seed; trial i is seeded with seed + i.
+        :param soc_range: Optional (low, high) range to draw each trial's initial state of charge from.
+                          The draws use a separate generator and do not disturb the episode sampling.
+        """
+        entries = np.empty(trials, dtype=PLAN_DTYPE)
+        for trial in range(trials):
+            entries[trial]['start_step'], entries[trial]['episode_length'] = sample_episode(seed + trial, n_rows)
+            entries[trial]['seed'] = seed + trial
+        if soc_range is None:
+            entries['initial_soc'] = np.nan
+        else:
+            entries['initial_soc'] = np.random.default_rng(seed).uniform(soc_range[0], soc_range[1], trials)
+        return cls(entries, n_rows)
+
+    @classmethod
+    def cached(cls, data, n_rows, trials, seed, soc_range=None, plan_dir=DEFAULT_PLAN_DIR):
+        """
+        Load the plan for a dataset from the plan cache, generating and saving it on first use.
+
+        :param data: Path to the market data CSV; its content hash keys the cache.
+        :param n_rows: Number of rows of the market data.
+        :param trials: Number of trials.
+        :param seed: Base seed of the plan.
+        :param soc_range: Optional (low, high) range of initial states of charge.
+        :param plan_dir: Directory holding cached plans.
+        """
+        soc_key = 'default' if soc_range is None else f'{soc_range[0]:g}-{soc_range[1]:g}'
+        path = os.path.join(plan_dir, f'{file_digest(data)}_{trials}_{seed}_{soc_key}.npz')
+        if os.path.exists(path):
+            return cls.load(path)
+        plan = cls.generate(n_rows, trials, seed, soc_range)
+        os.makedirs(plan_dir, exist_ok=True)
+        plan.save(path)
+        return plan
+
+    def save(self, path):
+        """
+        Save the plan as an NPZ file.
+        """
+        np.savez(path, entries=self.entries, n_rows=self.n_rows)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a plan saved with save.
+        """
+        with np.load(path) as plan:
+            return cls(plan['entries'], int(plan['n_rows']))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, trial):
+        return self.entries[trial]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def check(self, n_rows):
+        """
+        Raise ValueError unless the plan was drawn for market data with n_rows rows.
+        """
+        if n_rows != self.n_rows:
+            raise ValueError(f'Trial plan was drawn for {self.n_rows} rows of market data, got {n_rows}')
+
+    def start_trial(self, entry):
+        """
+        Seed the random number generators for a planned trial, exactly as evaluate.py did
+        before sampling and running the trial.
+
+        :param entry: Plan entry of the trial.
+        :return: Start step, episode length and initial state of charge (None for the default).
+        """
+        sample_episode(int(entry['seed']), self.n_rows)
+        initial_soc = float(entry['initial_soc'])
+        return int(entry['start_step']), int(entry['episode_length']), None if np.isnan(initial_soc) else initial_soc
+
+    def initial_socs(self, default):
+        """
+        Return the initial state of charge of every trial, with default filled in where unset.
+        """
+        return np.where(np.isnan(self.entries['initial_soc']), default, self.entries['initial_soc'])
+
+    def windows(self, values):
+        """
+        Return zero-copy views of a per-step array covering each trial's window, which runs
+        from its start step to the end of the data. Useful to slice prices or precomputed
+        features once per trial.
+
+        :param values: Array with one value per row of the market data.
+        """
+        return [values[start:] for start in self.entries['start_step']]
@@ -0,0 +1,223 @@
+"""
+Vectorized battery environment that steps many episodes in lockstep.
+
+VectorBatteryEnv holds the state of charge, profit and current step of N independent
+episodes as NumPy arrays and applies the charge/discharge clipping and efficiency of
+Battery and BatteryEnv.process_action as array operations. Policies opt in to batched
+decisions by defining ``act_batch(observations, infos)``; scalar policies are wrapped in a
+ScalarPolicyAdapter that calls ``act`` once per running episode.
+"""
+
+import copy
+import numpy as np
+import pandas as pd
+from battery_kernel import step_batteries
+from market_data import ColumnarMarketData, MarketRow, open_market_data
+
+
+class VectorBatteryEnv:
+    def __init__(self, num_envs, capacity=100, charge_rate=50, discharge_rate=50, initial_charge=50,
+                 efficiency=0.9, data='train.csv', backend='columnar'):
+        """
+        Environment for simulating N batteries, each in its own episode over the same market data.
+
+        :param num_envs: Number of episodes stepped in lockstep.
+        :param capacity: Maximum capacity of each battery in kWh.
+        :param charge_rate: Maximum charging rate of each battery in kW.
+        :param discharge_rate: Maximum discharging rate of each battery in kW.
+        :param initial_charge: Initial state of charge of each battery in kWh.
+        :param efficiency: Charging and discharging efficiency of each battery.
+        :param data: Path to the CSV file containing market data, or already loaded market data.
+        :param backend: Market data backend used when data is a path.
+        """
+        self.num_envs = num_envs
+        self.capacity = capacity
+        self.charge_rate = charge_rate
+        self.discharge_rate = discharge_rate
+        self.initial_charge = initial_charge
+        self.efficiency = efficiency
+
+        market_data = open_market_data(data, backend)
+        if isinstance(market_data, pd.DataFrame):
+            market_data = ColumnarMarketData.from_dataframe(market_data)
+        if not isinstance(market_data, ColumnarMarketData):
+            raise ValueError('VectorBatteryEnv needs whole columns in memory; use the columnar or cached backend')
+        self.market_data = market_data
+        self._columns = {name: market_data.column(name) for name in market_data.columns}
+        self._prices = self._columns['Market_Price']
+
+        self.state_of_charge = np.full(num_envs, min(initial_charge, capacity), dtype=float)
+        self.total_profit = np.zeros(num_envs)
+        self.current_step = np.zeros(num_envs, dtype=np.int64)
+        self.episode_length = np.full(num_envs, len(market_data), dtype=np.int64)
+        self.done = np.zeros(num_envs, dtype=bool)
+
+    def reset(self, start_steps=0, episode_lengths=None, initial_socs=None):
+        """
+        Reset every episode. Arguments are scalars or arrays of length num_envs.
+
+        :param start_steps: Starting step of each episode.
+        :param episode_lengths: Length of each episode in steps.
+        :param initial_socs: Initial state of charge of each battery.
+        :return: Batched observations and infos, see get_observations and get_info.
+        """
+        n = self.num_envs
+        self.current_step = np.broadcast_to(np.asarray(start_steps, dtype=np.int64), (n,)).copy()
+        self.total_profit = np.zeros(n)
+        if episode_lengths is None:
+            self.episode_length = len(self.market_data) - self.current_step
+        else:
+            self.episode_length = np.broadcast_to(np.asarray(episode_lengths, dtype=np.int64), (n,)).copy()
+        if initial_socs is None:
+            initial_socs = self.initial_charge
+        self.state_of_charge = np.minimum(np.broadcast_to(np.asarray(initial_socs, dtype=float), (n,)), self.capacity)
+        self.done = np.zeros(n, dtype=bool)
+        return self.get_observations(), self.get_info(np.zeros(n))
+
+    def step(self, actions):
+        """
+        Apply one action per episode. Episodes that already reached the end of the market data
+        are marked done and their actions are ignored, mirroring BatteryEnv.step returning None.
+
+        :param actions: Array of num_envs actions in kW.
+        :return: Batched observations, batched infos and the done mask.
+        """
+        self.done |= self.current_step >= len(self.market_data) - 1
+        active = ~self.done
+        actions = np.where(active, np.asarray(actions, dtype=float), 0.0)
+        market_prices = self._prices[self.current_step]
+        profit_delta = self.process_actions(actions, market_prices)
+        self.current_step += active
+        return self.get_observations(), self.get_info(profit_delta), self.done
+
+    def process_actions(self, actions, market_prices):
+        """
+        Array version of BatteryEnv.process_action combined with Battery.charge and
+        Battery.discharge, performing the same floating-point operations in the same order.
+
+        :param actions: Array of actions in kW; positive charges, negative discharges.
+        :param market_prices: Market price at the current step of each episode.
+        :return: Profit delta of each episode.
+        """
+        self.state_of_charge, profit_delta = step_batteries(self.state_of_charge, actions, market_prices, self.capacity,
+                                                            self.charge_rate, self.discharge_rate, self.efficiency)
+        return profit_delta
+
+    def get_observations(self):
+        """
+        Return the market data at the current step of every episode as a dictionary
+        mapping column names to arrays of length num_envs.
+        """
+        return {name: values[self.current_step] for name, values in self._columns.items()}
+
+    def get_info(self, profit_delta):
+        self.total_profit = self.total_profit + np.where(self.done, 0.0, profit_delta)
+        n = self.num_envs
+        return {
+            'total_profit': self.total_profit,
+            'profit_delta': profit_delta,
+            'battery_soc': self.state_of_charge,
+            'max_charge_rate': np.full(n, self.charge_rate),
+            'max_discharge_rate': np.full(n, self.discharge_rate),
+            'remaining_steps': len(self.market_data) - self.current_step - 1,
+            'done': self.done,
+        }
+
+
+class ScalarPolicyAdapter:
+    def __init__(self, policies):
+        """
+        Adapt scalar policies to the batched ``act_batch`` interface.
+
+        :param policies: One policy instance per episode; each keeps its own internal state.
+        """
+        self.policies = policies
+
+    @classmethod
+    def from_policy(cls, policy, num_envs):
+        """
+        Wrap independent copies of a policy, one per episode.
+
+        :param policy: Policy instance to copy.
+        :param num_envs: Number of episodes.
+        """
+        return cls([copy.deepcopy(policy) for _ in range(num_envs)])
+
+    def act_batch(self, observations, infos):
+        """
+        Call ``act`` of every running episode's policy with a scalar observation and info.
+
+        :param observations: Batched observations from VectorBatteryEnv.
+        :param infos: Batched infos from VectorBatteryEnv.
+        :return: Array of actions, zero for finished episodes.
+        """
+        actions = np.zeros(len(self.policies))
+        keys = [key for key in infos if key != 'done']
+        for i in np.flatnonzero(~infos['done']):
+            info = {key: infos[key][i].item() for key in keys}
+            actions[i] = self.policies[i].act(MarketRow(observations, i), info)
+        return actions
+
+
+def is_stateful(policy):
+    """
+    Return whether a policy instance holds state beyond plain parameters, judged by its attributes:
+    anything other than numbers, strings, None and tuples of them is taken to be state, such as a
+    window of past prices. In VectorBatteryEnv every episode starts from a fresh state, while the
+    serial trial loop keeps one policy across trials, so such policies score differently.
+    """
+    def plain(value):
+        if isinstance(value, tuple):
+            return all(plain(item) for item in value)
+        return value is None or isinstance(value, (bool, int, float, str))
+
+    return not all(plain(value) for value in vars(policy).values())
+
+
+def batch_policy(policy, num_envs):
+    """
+    Return a policy usable with VectorBatteryEnv: the policy itself if it defines
+    ``act_batch``, otherwise a ScalarPolicyAdapter over copies of it.
+    """
+    if hasattr(policy, 'act_batch'):
+        return policy
+    return ScalarPolicyAdapter.from_policy(policy, num_envs)
+
+
+def run_trials(env, policy, start_steps, episode_lengths=None, initial_socs=None):
+    """
+    Run one episode per start step in lockstep, recording the same series as evaluate.run_trial.
+    The series of every episode are held until all of them finish, so run large numbers of
+    trials in batches (see evaluate.vectorized_trials) to bound memory.
+
+    :param env: VectorBatteryEnv with num_envs equal to the number of start steps.
+    :param policy: Policy with ``act_batch``, or a scalar policy to be adapted.
+    :param start_steps: Starting step of each episode.
+    :param episode_lengths: Length of each episode in steps.
+    :param initial_socs: Initial state of charge of each battery.
+    :return: List of (actions, profits, socs, market_prices) arrays, one tuple per episode.
+    """
+    policy = batch_policy(policy, env.num_envs)
+    start_steps = np.asarray(start_steps, dtype=np.int64)
+    # Every episode runs to the end of the market data, so its number of recorded steps is known
+    # up front and all episodes can share flat buffers indexed by offset + steps taken.
+    lengths = np.maximum(len(env.market_data) - 1 - start_steps, 0)
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    buffers = {name: np.empty(lengths.sum()) for name in ('actions', 'profits', 'socs', 'market_prices')}
+
+    observations, infos = env.reset(start_steps, episode_lengths, initial_socs)
+    steps_taken = 0
+    while True:
+        actions = np.asarray(policy.act_batch(observations, infos), dtype=float)
+        observations, infos, done = env.step(actions)
+        if done.all():
+            break
+        index = offsets[~done] + steps_taken
+        buffers['actions'][index] = actions[~done]
+        buffers['profits'][index] = infos['total_profit'][~done]
+        buffers['socs'][index] = infos['battery_soc'][~done]
+        buffers['market_prices'][index] = observations['Market_Price'][~done]
+        steps_taken += 1
+
+    return [tuple(buffers[name][offset:offset + length] for name in ('actions', 'profits', 'socs', 'market_prices'))
+            for offset, length in zip(offsets, lengths)]